@@ -26,6 +26,26 @@ class Admin(commands.Cog):
             except Exception:
                 traceback.print_exc()
 
+    @commands.command(name='zpstats', help='Show ZwiftPower request metrics. "reset" starts counting again')
+    @commands.is_owner()
+    async def zpstats(self, ctx, *args):
+        scraper = getattr(ctx.bot, 'scraper', None)
+        if scraper is None:
+            await ctx.send("No ZwiftPower requests made yet")
+            return
+        lines = [scraper.metrics.format()]
+        lines.append("Queued: " + ", ".join("{} {}".format(n, cls) for cls, n in scraper.queued().items()))
+        for host, status in scraper.breaker.snapshot().items():
+            lines.append("{}: {} after {} failures, retry in {:.0f}s".format(
+                host, status['state'], status['failures'], status['retry_in']))
+        roster = getattr(ctx.bot.get_cog('ZwiftPower'), 'roster', None)
+        if roster is not None:
+            lines.append("Roster: {} members, refreshed {}".format(
+                len(roster.index), roster.refreshed.strftime('%Y-%m-%d %H:%M') if roster.refreshed else 'never'))
+        await ctx.send("```\n{}\n```".format("\n".join(lines)))
+        if 'reset' in args:
+            scraper.metrics.reset()
+
 
 async def setup(bot):
     await bot.add_cog(Admin(bot, bot.EXTENSIONS))
@@ -0,0 +1,240 @@
+"""
+Per-host circuit breaker for the sites the bot talks to.
+
+When ZwiftPower or the Zwift API answers ``429``/``5xx`` or stops answering, each failed request counts against
+its host. After :attr:`CircuitBreaker.threshold` failures in a row the circuit opens: requests to that host fail
+right away with :class:`CircuitOpen` instead of adding to the load, for an exponentially growing, jittered backoff
+(or as long as the site's ``Retry-After`` asks). Once the backoff is over a single request is let through as a
+probe; if it succeeds the circuit closes again, otherwise the next, longer backoff starts.
+
+The breaker sits in a transport adapter, like the rate limiter, so it sees every request including the login
+dance. Callers that have a cache (the Scraper) serve the cached response while a host is unavailable.
+"""
+import email.utils
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+from requests import ConnectionError, HTTPError, Session, Timeout
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Answers that mean the site is overloaded or down, rather than that something is wrong with our request
+FAILURE_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpen(ConnectionError):
+    """A request wasn't sent because its host is unavailable"""
+
+    def __init__(self, host: str, retry_in: float, **kwargs):
+        super().__init__("{} is unavailable, not retrying for {:.0f}s".format(host, retry_in), **kwargs)
+        self.host = host
+        self.retry_in = retry_in
+
+
+def is_outage(e: Exception) -> bool:
+    """Whether ``e`` means the host is unavailable, as opposed to e.g. a missing page or a bug"""
+    if isinstance(e, (ConnectionError, Timeout)):
+        return True
+    return isinstance(e, HTTPError) and e.response is not None and e.response.status_code in FAILURE_STATUSES
+
+
+def retry_after(resp) -> Optional[float]:
+    """The ``Retry-After`` header of a response in seconds, if it has a usable one"""
+    value = resp.headers.get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostCircuit:
+    def __init__(self):
+        self.failures = 0
+        self.is_open = False
+        # Times the circuit opened without a healthy period in between, for the backoff
+        self.trips = 0
+        # End of the latest backoff
+        self.open_until = 0.0
+        self.probing = False
+
+    def state(self, now: float) -> str:
+        if not self.is_open:
+            return CLOSED
+        return OPEN if now < self.open_until or self.probing else HALF_OPEN
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breakers, one per host.
+
+    :param threshold: Consecutive failures that open the circuit
+    :param base_delay: Seconds the circuit stays open the first time; doubled every time it opens again
+    :param max_delay: Upper limit of the backoff
+    :param jitter: Fraction of the backoff that is randomized, so several processes don't all come back at once
+    """
+
+    def __init__(self, threshold: int = 3, base_delay: float = 5.0, max_delay: float = 600.0, jitter: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic, rand: Callable[[], float] = random.random):
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self._clock = clock
+        self._rand = rand
+        self._hosts: Dict[str, HostCircuit] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).hostname or ''
+
+    def _get(self, host: str) -> HostCircuit:
+        if host not in self._hosts:
+            self._hosts[host] = HostCircuit()
+        return self._hosts[host]
+
+    def backoff(self, trips: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (trips - 1))
+        return delay * (1 - self.jitter * self._rand())
+
+    def check(self, url: str):
+        """
+        Raise :class:`CircuitOpen` if requests to the host of ``url`` shouldn't be sent now. When the backoff is
+        over, the first caller gets through as the probe.
+        """
+        host = self.host(url)
+        now = self._clock()
+        with self._lock:
+            circuit = self._get(host)
+            state = circuit.state(now)
+            if state == HALF_OPEN:
+                circuit.probing = True
+                logger.info("Trying %s again", host)
+            elif state == OPEN:
+                raise CircuitOpen(host, max(0.0, circuit.open_until - now))
+
+    def success(self, url: str):
+        host = self.host(url)
+        with self._lock:
+            circuit = self._get(host)
+            if circuit.is_open:
+                logger.info("%s is available again", host)
+            circuit.is_open = False
+            circuit.failures = 0
+            circuit.probing = False
+
+    def failure(self, url: str, retry_after: float = None):
+        """
+        Count a failed request. The circuit opens after :attr:`threshold` of them, after a failed probe, or right
+        away when the site said when to come back with ``retry_after``.
+        """
+        host = self.host(url)
+        with self._lock:
+            circuit = self._get(host)
+            circuit.failures += 1
+            if circuit.failures < self.threshold and not circuit.probing and retry_after is None:
+                return
+            delay = self._open(circuit, retry_after)
+        logger.warning("%s is unavailable after %d failures, backing off for %.0fs", host, circuit.failures, delay)
+
+    def trip(self, url: str, retry_after: float = None):
+        """Open the circuit for the host of ``url`` right away"""
+        host = self.host(url)
+        with self._lock:
+            delay = self._open(self._get(host), retry_after)
+        logger.warning("%s is refusing requests, backing off for %.0fs", host, delay)
+
+    def _open(self, circuit: HostCircuit, retry_after: Optional[float]) -> float:
+        now = self._clock()
+        if now - circuit.open_until > self.max_delay:
+            # The host has been fine for a while, start over with a short backoff
+            circuit.trips = 0
+        circuit.trips += 1
+        delay = max(self.backoff(circuit.trips), retry_after or 0.0)
+        circuit.open_until = now + delay
+        circuit.is_open = True
+        circuit.probing = False
+        return delay
+
+    def release(self, url: str):
+        """End a probe that neither succeeded nor failed, so the next request can probe instead"""
+        with self._lock:
+            self._get(self.host(url)).probing = False
+
+    def state(self, url: str) -> str:
+        with self._lock:
+            return self._get(self.host(url)).state(self._clock())
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """``{host: {'state': ..., 'failures': ..., 'retry_in': seconds}}`` for hosts that are failing"""
+        now = self._clock()
+        with self._lock:
+            return {host: {'state': c.state(now), 'failures': c.failures, 'retry_in': max(0.0, c.open_until - now)}
+                    for host, c in self._hosts.items() if c.failures or c.is_open}
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+class BreakerAdapter(BaseAdapter):
+    """Transport adapter that checks the breaker before handing a request to ``inner``, and reports the outcome"""
+
+    def __init__(self, inner: BaseAdapter, breaker: CircuitBreaker):
+        super().__init__()
+        self.inner = inner
+        self.breaker = breaker
+
+    def send(self, request, **kwargs):
+        try:
+            self.breaker.check(request.url)
+        except CircuitOpen as e:
+            e.request = request
+            raise
+        try:
+            resp = self.inner.send(request, **kwargs)
+        except (ConnectionError, Timeout):
+            self.breaker.failure(request.url)
+            raise
+        except BaseException:
+            self.breaker.release(request.url)
+            raise
+        if resp.status_code in FAILURE_STATUSES:
+            self.breaker.failure(request.url, retry_after(resp))
+        else:
+            self.breaker.success(request.url)
+        return resp
+
+    def close(self):
+        self.inner.close()
+
+
+def session(circuit_breaker: CircuitBreaker = None) -> Session:
+    """A requests Session that goes through ``circuit_breaker``, by default the shared :data:`breaker`"""
+    s = Session()
+    adapter = BreakerAdapter(HTTPAdapter(), breaker if circuit_breaker is None else circuit_breaker)
+    s.mount('https://', adapter)
+    s.mount('http://', adapter)
+    return s
+
+
+# Shared by every Scraper and API client in the process
+breaker = CircuitBreaker()
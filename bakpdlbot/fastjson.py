@@ -0,0 +1,50 @@
+"""
+JSON decoding for the payloads we download from ZwiftPower and Zwift.
+
+Uses orjson when it is installed (``pip install bakpdlbot[fast]``) and the stdlib ``json`` module otherwise. The
+two accept slightly different input (orjson only takes UTF-8 and rejects ``NaN``), so anything orjson refuses is
+handed to the stdlib decoder before giving up.
+"""
+import json
+from typing import Callable, Dict, Union
+
+from requests import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+BACKENDS: Dict[str, Callable] = {'json': json.loads}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+
+backend = 'orjson' if orjson is not None else 'json'
+_loads = BACKENDS[backend]
+
+
+def set_backend(name: str):
+    """Switch the decoder for the whole process, e.g. ``set_backend('json')`` to compare results"""
+    global backend, _loads
+    if name not in BACKENDS:
+        raise ValueError("Unknown or unavailable JSON backend {!r}; available: {}".format(name, ", ".join(BACKENDS)))
+    backend = name
+    _loads = BACKENDS[name]
+
+
+def loads(data: Union[bytes, str]):
+    try:
+        return _loads(data)
+    except ValueError:
+        if _loads is json.loads:
+            raise
+        return json.loads(data)
+
+
+def response_json(resp: Response):
+    """Drop-in for ``resp.json()``"""
+    try:
+        return _loads(resp.content)
+    except ValueError:
+        # Not UTF-8, or something only the stdlib accepts; let requests work out the encoding
+        return resp.json()
@@ -0,0 +1,319 @@
+"""
+Record and replay the HTTP traffic of the bot, and a local stand-in for ZwiftPower.
+
+Everything the bot downloads goes through a requests transport adapter: the Scraper's session, the Zwift events
+API in ``zwiftcom.get_event``, the game dictionary and ``zwiftracing.Team``. :func:`intercept` reroutes all of
+those to one of the adapters here, so scraper code, the event embed and the riderlist templates can be tested and
+benchmarked without a network:
+
+    with replay.intercept(replay.RecordingAdapter(cassette)):
+        ...                     # talks to the real sites and records every response
+    cassette.save()
+
+    with replay.intercept(replay.ReplayAdapter(Cassette('tests/data/cassettes/team.json'))):
+        ...                     # answered from the recording, no network
+
+:class:`StandInServer` serves a cassette over HTTP on localhost, together with the ZwiftPower/Zwift login dance,
+for load tests that should include real sockets, the rate limiter and logging in. Use :class:`StandInAdapter` to
+send requests for the real hosts to it.
+"""
+import base64
+import contextlib
+import io
+import json
+import logging
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from requests import ConnectionError
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+logger = logging.getLogger(__name__)
+
+# HTTPAdapter.send before intercept() replaces it
+_http_send = HTTPAdapter.send
+
+
+class ReplayMiss(ConnectionError):
+    """No recorded response for a request while replaying"""
+
+
+def normalize_url(url: str) -> str:
+    """The URL with its query parameters sorted, so recordings match regardless of parameter order"""
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+class Cassette:
+    """
+    Recorded responses, kept as a JSON file of ``{method, url, status, headers, body}`` entries.
+
+    A URL recorded several times is replayed in recording order, repeating the last response after that.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.entries: List[Dict] = []
+        self._replayed: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        if self.path is not None and self.path.exists():
+            self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+
+    @staticmethod
+    def _key(method: str, url: str) -> Tuple[str, str]:
+        return method.upper(), normalize_url(url)
+
+    def add(self, method: str, url: str, status: int, headers: Dict[str, str], body: bytes):
+        try:
+            entry_body, encoding = body.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            entry_body, encoding = base64.b64encode(body).decode('ascii'), 'base64'
+        with self._lock:
+            self.entries.append({
+                'method': method.upper(),
+                'url': normalize_url(url),
+                'status': status,
+                'headers': dict(headers),
+                'body': entry_body,
+                'encoding': encoding,
+            })
+
+    def find(self, method: str, url: str) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+        key = self._key(method, url)
+        with self._lock:
+            matches = [e for e in self.entries if (e['method'], e['url']) == key]
+            if not matches:
+                return None
+            i = self._replayed.get(key, 0)
+            self._replayed[key] = i + 1
+        entry = matches[min(i, len(matches) - 1)]
+        if entry.get('encoding') == 'base64':
+            body = base64.b64decode(entry['body'])
+        else:
+            body = entry['body'].encode('utf-8')
+        return entry['status'], entry['headers'], body
+
+    def save(self, path=None):
+        path = Path(path) if path is not None else self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            path.write_text(json.dumps(self.entries, indent=1, ensure_ascii=False), encoding='utf-8')
+
+
+def build_response(request, status: int, headers: Dict[str, str], body: bytes):
+    # The body is stored decoded; don't let urllib3 try to decompress it again
+    headers = {k: v for k, v in headers.items() if k.lower() not in ('content-encoding', 'transfer-encoding')}
+    headers['Content-Length'] = str(len(body))
+    raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, preload_content=False,
+                       request_url=request.url)
+    return HTTPAdapter().build_response(request, raw)
+
+
+class _Network(HTTPAdapter):
+    """An HTTPAdapter that still reaches the network while :func:`intercept` is active"""
+
+    def send(self, request, **kwargs):
+        return _http_send(self, request, **kwargs)
+
+
+class RecordingAdapter(BaseAdapter):
+    """Sends requests over the network and adds every response to ``cassette``"""
+
+    def __init__(self, cassette: Cassette, inner: BaseAdapter = None):
+        super().__init__()
+        self.cassette = cassette
+        self.inner = inner if inner is not None else _Network()
+
+    def send(self, request, **kwargs):
+        resp = self.inner.send(request, **kwargs)
+        self.cassette.add(request.method, request.url, resp.status_code, resp.headers, resp.content)
+        return resp
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Answers requests from ``cassette``, raising :class:`ReplayMiss` for anything that wasn't recorded"""
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        found = self.cassette.find(request.method, request.url)
+        if found is None:
+            raise ReplayMiss("Not recorded: {} {}".format(request.method, request.url), request=request)
+        return build_response(request, *found)
+
+    def close(self):
+        pass
+
+
+@contextlib.contextmanager
+def intercept(adapter: BaseAdapter):
+    """Send everything that would go through a requests HTTPAdapter in this process to ``adapter`` instead"""
+    def send(_, request, **kwargs):
+        return adapter.send(request, **kwargs)
+
+    HTTPAdapter.send = send
+    try:
+        yield adapter
+    finally:
+        HTTPAdapter.send = _http_send
+
+
+class StandIn:
+    """
+    Answers requests the way ZwiftPower and the Zwift login do, from a cassette.
+
+    Logging in is always possible: the front page links to a Zwift login form, posting it redirects back to
+    ZwiftPower, which sets the session cookie. With ``require_login``, ZwiftPower pages and ``api3.php`` requests
+    without that cookie get the logged-out front page; the ``cache3`` files are public like on the real site.
+    """
+    ZP = 'zwiftpower.com'
+    ZWIFT_LOGIN = 'https://secure.zwift.com/login'
+    SIGNON = 'https://secure.zwift.com/signon'
+    COOKIE = 'zp_session'
+    FRONT_PAGE = ('<html><body><form method="post" id="login" action="/ucp.php?mode=login">'
+                  '<a href="' + ZWIFT_LOGIN + '">Login with Zwift</a></form></body></html>')
+    LOGIN_PAGE = ('<html><body><form id="form" method="post" action="' + SIGNON + '">'
+                  '<input name="username"><input name="password" type="password">'
+                  '<input name="rememberMe" type="checkbox" value="on"></form></body></html>')
+    WELCOME_PAGE = '<html><body><a href="/ucp.php?mode=logout">Logout</a></body></html>'
+
+    def __init__(self, cassette: Cassette, require_login: bool = True):
+        self.cassette = cassette
+        self.require_login = require_login
+        self.sessions = set()
+        self.logins = 0
+        self.requests: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def logged_in(self, cookie_header: str) -> bool:
+        for part in (cookie_header or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == self.COOKIE and value in self.sessions:
+                return True
+        return False
+
+    def respond(self, method: str, url: str, cookie_header: str = None) -> Tuple[int, Dict[str, str], bytes]:
+        with self._lock:
+            self.requests.append((method, url))
+        parts = urlsplit(url)
+        html = {'Content-Type': 'text/html; charset=UTF-8'}
+        if url.startswith(self.ZWIFT_LOGIN):
+            return 200, html, self.LOGIN_PAGE.encode()
+        if url.startswith(self.SIGNON) and method == 'POST':
+            return 302, {'Location': 'https://{}/ucp.php?mode=login'.format(self.ZP)}, b''
+        if parts.hostname == self.ZP and parts.path == '/ucp.php' and 'mode=login' in parts.query:
+            session = secrets.token_hex(8)
+            with self._lock:
+                self.sessions.add(session)
+                self.logins += 1
+            headers = dict(html, **{'Set-Cookie': '{}={}; Path=/'.format(self.COOKIE, session)})
+            return 200, headers, self.WELCOME_PAGE.encode()
+        logged_in = self.logged_in(cookie_header)
+        if parts.hostname == self.ZP and parts.path in ('', '/'):
+            return 200, html, (self.WELCOME_PAGE if logged_in else self.FRONT_PAGE).encode()
+        public = parts.path.startswith('/cache3/')
+        if parts.hostname == self.ZP and self.require_login and not logged_in and not public:
+            if parts.path == '/api3.php':
+                return 403, html, b'Forbidden'
+            return 200, html, self.FRONT_PAGE.encode()
+        found = self.cassette.find(method, url)
+        if found is None:
+            return 404, html, b'Not recorded'
+        return found
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        host = self.headers.get(StandInAdapter.HOST_HEADER, StandIn.ZP)
+        url = 'https://{}{}'.format(host, self.path)
+        status, headers, body = self.server.standin.respond(self.command, url, self.headers.get('Cookie'))
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'content-encoding', 'transfer-encoding', 'connection'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        logger.debug("stand-in: " + format, *args)
+
+
+class StandInServer:
+    """
+    :class:`StandIn` served over HTTP on a free port of localhost, in a background thread. Use as a context
+    manager, or call :meth:`start` and :meth:`stop`.
+    """
+
+    def __init__(self, cassette: Cassette, require_login: bool = True, port: int = 0):
+        self.standin = StandIn(cassette, require_login=require_login)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+        self._server.daemon_threads = True
+        self._server.standin = self.standin
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    def start(self) -> 'StandInServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='zp-standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class StandInAdapter(BaseAdapter):
+    """Sends requests for any host to a :class:`StandInServer`, which sees the original host in a header"""
+    HOST_HEADER = 'X-Stand-In-Host'
+
+    def __init__(self, server_url: str, inner: BaseAdapter = None):
+        super().__init__()
+        self.server_url = server_url.rstrip('/')
+        self.inner = inner if inner is not None else _Network()
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        local = request.copy()
+        local.url = self.server_url + urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        local.headers[self.HOST_HEADER] = parts.netloc
+        # Proxies were picked for the original host
+        kwargs['proxies'] = {}
+        resp = self.inner.send(local, **kwargs)
+        # To the session (cookies, redirects, caching) it looks like the original host answered
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        self.inner.close()
@@ -1,11 +1,12 @@
+import asyncio
 import csv
 import io
 import logging
 import os
 import sys
-from datetime import timedelta, date, datetime
+from datetime import timedelta
 from pathlib import Path
-from typing import Dict, List
+from typing import List
 
 import ago
 import click
@@ -15,9 +16,14 @@ from appdirs import user_cache_dir
 from dotenv import load_dotenv
 from jinja2 import Environment, FileSystemLoader, StrictUndefined
 from matplotlib.figure import Figure
-from requests_cache import CachedSession
 
-from .zwiftpower.scraper import Scraper
+from .zwiftpower import ratelimit, scheduler
+# The race classification used to live here
+from .zwiftpower.history import (RaceHistory, is_race, is_zrl, is_zrl_ttt, is_wtrl_ttt, is_frr_ttt,  # noqa: F401
+                                 is_ttt)
+from .zwiftpower.power import PowerMatrix
+from .zwiftpower.scraper import Scraper, cached_session
+from .zwiftpower.store import RiderStore
 from . import zwiftracing
 
 from .zp import make_cp, ago_fmt
@@ -66,7 +72,7 @@ def filter_cp_svg(riders, type_='wkg', style='default') -> str:
         if graph is None:
             continue
         graph = graph['90days']
-        plots.append([graph.keys(), graph.values(), rider.name])
+        plots.append([graph.x, graph.y, rider.name])
     ctx = matplotlib.pyplot.xkcd if style == 'xkcd' else lambda: matplotlib.pyplot.style.context(style)
 
     with ctx():
@@ -83,15 +89,10 @@ def filter_power_bars(riders, type_, period, style='default', direction='horizon
         fig = plt.figure()
         ax = fig.add_subplot(1, 1, 1)
         ax.set_title("90 day {} power".format(ago_fmt(period, None)))
-        x = []
-        y = []
-        for rider in riders:
-            graph = rider.cp_watts if type_ == 'watts' else rider.cp_wkg
-            if graph is None:
-                continue
-            graph = graph['90days']
-            x.append(rider.name)
-            y.append(graph[period])
+        power = PowerMatrix(riders, [period])
+        column = power.column(period, 'watts' if type_ == 'watts' else 'wkg')
+        x = [rider.name for rider, _ in column]
+        y = [value for _, value in column]
         if direction == 'vertical':
             ax.bar(x, y)
             ax.set_ylabel(type_)
@@ -128,88 +129,15 @@ def flag_unicode(flag: str) -> str:
     return r
 
 
-def is_race(race: Dict) -> bool:
-    return 'TYPE_RACE' in race['f_t']
-
-
-def is_zrl(race: Dict) -> bool:
-    return 'Zwift Racing League'.lower() in race['event_title'].lower()
-
-
-def is_zrl_ttt(race: Dict) -> bool:
-    if not is_zrl(race):
-        return False
-
-    ttt_dates = [
-        # ZRL 20/21 Season 1
-        date(2020, 10, 19), date(2020, 10, 20),  # Week 2
-        date(2020, 11,  2), date(2020, 11,  3),  # Week 4
-        date(2020, 11, 16), date(2020, 11, 17),  # Week 6
-        date(2020, 11, 30), date(2020, 12,  1),  # Week 8
-        date(2020, 12, 15), date(2020, 12, 16),  # Week 10
-        # ZRL 20/21 Season 2
-        date(2021,  1, 18), date(2021,  1, 19),  # Week 2
-        date(2021,  2,  8), date(2021,  2,  9),  # Week 5
-        date(2021,  3,  1), date(2021,  3,  2),  # Week 8
-        # ZRL 20/21 Season 3
-        date(2021,  4,  6), date(2021,  4,  7),  # Week 1
-        date(2021,  4, 27), date(2021,  4, 28),  # Week 4
-        date(2021,  5, 18), date(2021,  5, 19),  # Week 7
-        date(2021,  6,  6), date(2021,  6,  7),  # Playoff TTT
-        # ZRL 21/22 Season 1
-        date(2021,  9, 28), date(2021,  9, 29),  # Week 1
-        date(2021, 10,  8), date(2021, 10,  9),  # Week 7
-        date(2021, 11, 23), date(2021, 11, 24),  # Playoff TTT
-        # ZRL 21/22 Season 2
-        date(2022,  2,  1), date(2022,  2,  2),  # Week 4
-        date(2022,  2, 22), date(2022,  2, 23),  # Week 7
-        date(2022,  3, 12), date(2022,  3, 13),  # Playoff TTT
-        # ZRL 21/22 Season 3
-        date(2022,  4, 12), date(2022,  4, 13),  # Week 2
-        date(2022,  5,  3), date(2022,  5,  4),  # Week 5
-        # ZRL 22/23 Round 1
-        date(2022,  9, 27), date(2022,  9, 28),  # Week 3
-        # ZRL 22/23 Round 2
-        date(2022, 11, 15), date(2022, 11, 16),  # Week 2
-        date(2022, 12,  6), date(2022, 12,  7),  # Week 5
-        # ZRL 22/23 Round 3
-        date(2023,  1, 17), date(2023,  1, 18),  # Week 2
-        date(2023,  2,  7), date(2023,  2,  8),  # Week 5
-        # ZRL 23/24 Round 1
-        date(2023,  9, 26), date(2023,  9, 27),  # Week 3
-        date(2023, 10, 17), date(2023, 10, 18),  # Week 3
-        # ZRL 23/24 Round 2
-        date(2023, 11, 28), date(2023, 11, 29),  # Week 3
-        date(2023, 12, 19), date(2023, 12, 20),  # Week 3
-        # ZRL 23/24 Round 3
-        date(2024,  2,  6), date(2024,  2,  7),  # Week 3
-        date(2024,  2, 27), date(2024,  2, 28),  # Week 3
-        # ZRL 24/25 Round 1
-        date(2024,  9, 10), date(2024,  9, 11),  # Week 1
-        date(2024, 10,  1), date(2024, 10,  2),  # Week 4
-    ]
-    race_date = datetime.utcfromtimestamp(race['event_date'])
-    return race_date.date() in ttt_dates
-
-
-def is_wtrl_ttt(race: Dict) -> bool:
-    return 'WTRL Team Time Trial' in race['event_title']
-
-
-def is_frr_ttt(race: Dict) -> bool:
-    title = race['event_title']
-    return 'FRR' in title and 'TTT' in title
-
-
-def is_ttt(race: Dict) -> bool:
-    return is_wtrl_ttt(race) or is_zrl_ttt(race) or is_frr_ttt(race)
-
-
 def filter_ttts(races):
+    if isinstance(races, RaceHistory):
+        return iter(races.ttts)
     return filter(is_ttt, races)
 
 
 def filter_races(races):
+    if isinstance(races, RaceHistory):
+        return iter(races.races)
     return filter(is_race, races)
 
 
@@ -248,7 +176,7 @@ class SourceType(click.ParamType):
             if ':' not in value:
                 self.fail('Format must be type:id')
             type_, id_ = value.split(':', 1)
-            types = ('team', 'race_results', 'race_signups', 'riders')
+            types = ('team', 'race_results', 'race_unfiltered', 'race_signups', 'riders')
             if type_ not in types:
                 self.fail('Unsupported type {}. Supported source types: {}'.format(type_, ", ".join(types)))
             if type_ in ('riders',):
@@ -259,6 +187,20 @@ class SourceType(click.ParamType):
             self.fail('ID must be an integer (comma-separated ints, where supported)')
 
 
+class Streamed:
+    """
+    Riders of a race file that are decoded again on every pass instead of being kept in memory. Templates can
+    loop over it as often as they like, but can't index it or take its length.
+    """
+
+    def __init__(self, stream, fields=None):
+        self.stream = stream
+        self.fields = fields
+
+    def __iter__(self):
+        return self.stream(fields=self.fields)
+
+
 class Getters:
     @staticmethod
     def team(scraper: Scraper, id_: int):
@@ -293,26 +235,42 @@ class Getters:
         }
 
     @staticmethod
-    def race_results(scraper: Scraper, id_: int):
+    def race_results(scraper: Scraper, id_: int, stream: bool = False, fields: List[str] = None):
         """Return all riders in the results of a race"""
         race = scraper.race(id_)
         return {
             'race': race,
             'type': 'race_results',
-            'riders': list(race.results)
+            'riders': Streamed(race.stream_results, fields) if stream else list(race.results)
         }
 
     @staticmethod
-    def race_unfiltered(scraper: Scraper, id_: int):
+    def race_unfiltered(scraper: Scraper, id_: int, stream: bool = False, fields: List[str] = None):
         """Return all riders in the results of a race"""
         race = scraper.race(id_)
         return {
             'race': race,
             'type': 'race_unfiltered',
-            'riders': list(race.unfiltered)
+            'riders': Streamed(race.stream_unfiltered, fields) if stream else list(race.unfiltered)
         }
 
 
+def prefetch_profiles(scraper: Scraper, ids: List[int], parts: List[str]):
+    """
+    Load the profiles of all riders concurrently, so the template doesn't fetch them one by one. Parts that are
+    fresh in the scraper's rider store from an earlier run aren't fetched again.
+    """
+    def progress(done, total):
+        if done == total or done % 10 == 0:
+            logging.info("Fetched %d/%d profiles", done, total)
+
+    # A bulk job: anything interactive sharing the scraper goes first
+    with scheduler.priority(scheduler.BACKGROUND):
+        errors = asyncio.run(scraper.sync_profiles(ids, parts=parts, progress=progress))
+    for id_, e in errors.items():
+        logging.warning("Profile %s could not be fetched: %r", id_, e)
+
+
 @click.command()
 @click.option('--clear-cache', is_flag=True)
 @click.option('--debug', is_flag=True, help='Enable debug logging')
@@ -321,9 +279,16 @@ class Getters:
 @click.option('--zwift-user', envvar='ZWIFT_USER', help='Will use environment ZWIFT_USER if set. Supports .env')
 @click.option('--zwift-pass', envvar='ZWIFT_PASS', help='Will use environment ZWIFT_PASS if set. Supports .env')
 @click.option('--var', 'tplvars', multiple=True, default=[], help='Variable to pass to the template, may be repeated', type=NamedVarType())
+@click.option('--prefetch', default='',
+              help='Profile parts the template uses, to fetch for all riders up front, comma-separated, '
+                   'e.g. snapshot,cp_wkg,cp_watts,races. Not supported with --stream')
+@click.option('--stream', is_flag=True,
+              help='Decode race results while rendering instead of loading them all, for very big races')
+@click.option('--fields', help='With --stream: only keep these rider fields, comma-separated, e.g. zwid,name,tid')
 @click.argument('rider_list', type=SourceType())
 @click.argument('template')
-def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider_list, template):
+def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, prefetch, stream, fields, output_file, rider_list,
+         template):
     """
     Output some sort of rider list with data downloaded from ZwiftPower
 
@@ -341,14 +306,29 @@ def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider
     level = logging.DEBUG if debug else logging.INFO
     logging.basicConfig(level=level)
     source, id_ = rider_list
+    getter_args = {}
+    if stream:
+        if source not in ('race_results', 'race_unfiltered'):
+            raise click.UsageError('--stream is only supported for race_results and race_unfiltered')
+        getter_args = {'stream': True, 'fields': fields.split(',') if fields else None}
+    elif fields:
+        raise click.UsageError('--fields requires --stream')
+    parts = [p for p in prefetch.split(',') if p]
+    if stream and parts:
+        # Collecting the ids would decode the whole race up front, which is what --stream avoids
+        raise click.UsageError('--prefetch is not supported with --stream')
 
-    expire_after = timedelta(hours=12)
     cache_dir = Path(user_cache_dir('riderlist'))
     cache_dir.mkdir(parents=True, exist_ok=True)
-    cached = CachedSession(str(cache_dir / 'zp_cache'), expire_after=expire_after)
+    cached = cached_session(str(cache_dir / 'zp_cache'))
+    riders = RiderStore(cache_dir / 'riders.sqlite')
     if clear_cache:
         cached.cache.clear()
-    s = Scraper(username=zwift_user, password=zwift_pass, sleep=2.0, session=cached)
+        riders.clear()
+    # Bulk exports fetch a lot of profile pages; be gentler than the bot
+    ratelimit.limiter.configure(ratelimit.RateLimiter.PAGES, rate=0.5)
+    s = Scraper(username=zwift_user, password=zwift_pass, session=cached, cookie_file=cache_dir / 'zp_cookies.json',
+                store=riders)
     ctx = {
         'scraper': s,
         'now': pendulum.now()
@@ -368,10 +348,12 @@ def main(clear_cache, debug, zwift_user, zwift_pass, tplvars, output_file, rider
     env.filters['sdur'] = filter_sdur
     env.filters['powerbars_svg'] = filter_power_bars
     env.filters['csv_dict'] = filter_csv_dict
+    env.filters['power_matrix'] = PowerMatrix
 
     tpl = env.get_template(template)
-    with cached.cache_disabled():
-        ctx.update(getattr(Getters, source)(s, id_))
+    ctx.update(getattr(Getters, source)(s, id_, **getter_args))
+    if parts:
+        prefetch_profiles(s, [r.id for r in ctx['riders']], parts)
     result = tpl.render(args=dict(tplvars), **ctx)
 
     with click.open_file(output_file, mode='w') as f:
@@ -0,0 +1,57 @@
+"""
+Coalescing of identical concurrent calls.
+
+When several commands ask for the same page at the same time (the same event link pasted twice, the signup sweep
+overlapping ``!run_signups``), only the first call fetches it; the others wait for that call and get its result,
+or its exception.
+"""
+import threading
+from typing import Callable, Dict, Hashable, Tuple
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-safe: runs at most one call per key at a time, sharing its outcome with everyone who asked"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        """Return ``fn(*args, **kwargs)``, or the outcome of the call for ``key`` that is already running"""
+        return self.do_shared(key, fn, *args, **kwargs)[0]
+
+    def do_shared(self, key: Hashable, fn: Callable, *args, **kwargs) -> Tuple[object, bool]:
+        """Like :meth:`do`, but returns ``(result, shared)``: whether the result came from another caller's call"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._calls
@@ -3,22 +3,28 @@ import logging
 import os
 import typing
 from datetime import timedelta
-from pathlib import Path
 from dotenv import load_dotenv
 
 import ago
 import discord
 import matplotlib
 import matplotlib.pyplot as plt
-from appdirs import user_cache_dir
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord.ext.commands import BadArgument
-from requests_cache import CachedSession
 
-from .zwiftpower.scraper import Scraper, Profile
+from .zwiftpower import scheduler
+from .zwiftpower.power import PowerMatrix
+from .zwiftpower.roster import Roster
+from .zwiftpower.scraper import Profile, bot_scraper
 
 logger = logging.getLogger(__name__)
 
+# Durations the !cp command reports the weakest rider for, when comparing several
+WEAKEST_LINK_DURATIONS = (60, 300, 1200)
+# How often the stored profiles of the team are brought up to date. Only what's older than store.MAX_AGE is
+# fetched, so this is the shortest of those.
+PROFILE_SYNC_EVERY = timedelta(hours=3)
+
 
 def ago_fmt(v, _):
     td = timedelta(seconds=int(v))
@@ -57,18 +63,42 @@ class ZwiftPower(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
-        cache_dir = Path(user_cache_dir('bakpdlbot'))
-        cache_dir.mkdir(parents=True, exist_ok=True)
-        expire_after = timedelta(hours=12)
-        cached = CachedSession(str(cache_dir / 'zp_cache'), expire_after=expire_after)
         load_dotenv()
-        ZWIFTUSER = os.getenv('ZWIFT_USER')
-        ZWIFTPASS = os.getenv('ZWIFT_PASS')
         ZWIFTTEAM = os.getenv('ZP_TEAM_ID')
-        self.scraper = Scraper(sleep=1.0, username=ZWIFTUSER, password=ZWIFTPASS, session=cached)
-        self.team = self.scraper.team(int(ZWIFTTEAM))
+        self.scraper = bot_scraper(bot)
+        # Lookups search the last roster fetched in the background, see refresh_roster()
+        self.roster = Roster(self.scraper, int(ZWIFTTEAM))
+        self.team = self.roster.team
+        self.refresh_roster.start()
+        self.sync_profiles.start()
+
+    async def cog_unload(self):
+        self.refresh_roster.cancel()
+        self.sync_profiles.cancel()
+
+    @tasks.loop(seconds=Roster.REFRESH_EVERY.total_seconds())
+    async def refresh_roster(self):
+        try:
+            await self.roster.refresh()
+        except Exception as e:
+            # Keep the roster we have, and try again next time
+            logger.warning("Could not refresh the roster of team %s: %r", self.team.id, e)
+
+    @tasks.loop(seconds=PROFILE_SYNC_EVERY.total_seconds())
+    @scheduler.prioritized(scheduler.BACKGROUND)
+    async def sync_profiles(self):
+        """Keep the stored profiles of the team's members fresh, so lookups of any of them don't wait"""
+        ids = [m.id for m in self.roster.index.members]
+        try:
+            errors = await self.scraper.sync_profiles(ids)
+        except Exception as e:
+            logger.warning("Could not sync the profiles of team %s: %r", self.team.id, e)
+            return
+        if errors:
+            logger.warning("Could not sync %d of %d profiles of team %s", len(errors), len(ids), self.team.id)
 
     @commands.command(name="cp", help="Show Critical Power")
+    @scheduler.prioritized(scheduler.INTERACTIVE)
     async def cp(self, ctx, graph_type: typing.Optional[graph_type_conv], *names):
         zwift = ctx.bot.get_cog('Zwift')
         ids = []
@@ -83,40 +113,46 @@ class ZwiftPower(commands.Cog):
                 errors.append("Too many matches ({}) for {}".format(len(results), name))
 
         async with ctx.typing():
+            part = 'cp_watts' if graph_type == 'watt' else 'cp_wkg'
+            failed = await self.scraper.prefetch_profiles(ids, parts=('snapshot', part))
+            errors.extend("Could not load profile {}".format(id_) for id_ in failed)
+            ids = [id_ for id_ in ids if id_ not in failed]
             if len(ids) > 0:
                 plots = []
-                for profile in [self.scraper.profile(id_) for id_ in ids]:
-                    # Make sure plots come out in order
+                profiles = [self.scraper.profile(id_) for id_ in ids]
+                for profile in profiles:
                     cp = profile.cp_watts if graph_type == 'watt' else profile.cp_wkg
-                    cp_data = sorted(cp['90days'].items(), key=lambda i: i[0])
-                    plots.append(([i[0] for i in cp_data], [i[1] for i in cp_data], profile.name))
+                    # Durations are stored sorted, so the line comes out in order
+                    curve = cp['90days']
+                    plots.append((curve.x, curve.y, profile.name))
                 fig = make_cp(plots, "90 day critical power", graph_type)
                 fn = "cp_{}.png".format("_".join(map(str, ids)))
                 file = self._fig_to_file(fig, fn)
                 matplotlib.pyplot.close(fig)
+                weakest = self._weakest_links(profiles, graph_type) if len(profiles) > 1 else None
+                if weakest is not None:
+                    errors.append(weakest)
             else:
                 file = None
             await ctx.send("\n".join(errors), file=file)
 
+    @staticmethod
+    def _weakest_links(profiles: typing.List[Profile], graph_type: str) -> typing.Optional[str]:
+        if graph_type == 'watt':
+            unit, fmt = 'watts', "{} {} ({:.0f}W)"
+        else:
+            unit, fmt = 'wkg', "{} {} ({:.1f}w/kg)"
+        weakest = PowerMatrix(profiles, WEAKEST_LINK_DURATIONS).weakest(unit)
+        parts = []
+        for duration, link in weakest.items():
+            if link is not None:
+                profile, value = link
+                parts.append(fmt.format(ago_fmt(duration, None), profile.name, value))
+        return "Weakest link: " + ", ".join(parts) if parts else None
+
     def find_team_member(self, q: str) -> typing.List[Profile]:
         logger.debug("Lookup <%s>", q)
-
-        def exact(q: str):
-            return lambda m: q.lower() == m.name.lower()
-
-        def startswith(q: str):
-            return lambda m: m.name.lower().startswith(q.lower())
-
-        def contains(q: str):
-            return lambda m: q.lower() in m.name.lower()
-
-        members = list(self.team.members)
-        for match_fn in [exact, startswith, contains]:
-            matches = list(filter(match_fn(q), members))
-            if len(matches) > 0:
-                logging.debug("Found match(es) with %s for <%s>", match_fn.__name__, q)
-                return [m.profile for m in matches]
-        return []
+        return self.roster.find(q)
 
     @staticmethod
     def _fig_to_file(fig, fn):
@@ -13,7 +13,8 @@ from .sheet import Sheet
 from .simple import get_userlist
 from .zwiftcom import Event
 from .zwiftcom.const import items as list_of_items
-from .zwiftpower.scraper import get_scraper, Scraper
+from .zwiftpower import scheduler
+from .zwiftpower.scraper import bot_scraper, Scraper
 
 logger = logging.getLogger(__name__)
 
@@ -225,10 +226,11 @@ def get_item(item_id):
         return list_of_items[item_id]['name']
     return f"Unknown ({item_id})"
 
+@scheduler.prioritized(scheduler.BACKGROUND)
 async def send_signups_to_channel(c_id: int, bot: commands.Bot, scraper: Scraper, emojis):
     """Send signups to channel"""
     message_channel = (bot.get_channel(c_id) or await bot.fetch_channel(c_id))
-    eventlist = get_events_from_user_signups(scraper)
+    eventlist = await get_events_from_user_signups(scraper)
     # await message_channel.send("# Backpedal Signups in the upcoming 4 hours: \n"
     #                            "Want to be added to this list? Type !add_signups yourzwiftid \n"
     #                            "Want to be removed from this list? Type !del_signups yourzwiftid")
@@ -242,13 +244,15 @@ async def send_signups_to_channel(c_id: int, bot: commands.Bot, scraper: Scraper
             scraper=scraper,
             emojis=emojis)
 
-def get_events_from_user_signups(scraper: Scraper, hours=4):
+async def get_events_from_user_signups(scraper: Scraper, hours=4):
     """Get all events that known users are signed up for"""
     all_events = {}
-    user_list = get_userlist()['zwiftid'].to_list()
+    user_list = [str(riderid) for riderid in get_userlist()['zwiftid'].to_list()]
+    errors = await scraper.prefetch_profiles(user_list, parts=('signups',))
     for riderid in user_list:
-        riderprofile = scraper.profile(str(riderid))
-        signups = riderprofile.signups
+        if riderid in errors:
+            continue
+        signups = scraper.profile(riderid).signups
         for signup in signups:
             # Filter on events in the next x hours
             if not datetime.timestamp(datetime.now())+(3600*hours)<signup["tm"]:
@@ -257,8 +261,8 @@ def get_events_from_user_signups(scraper: Scraper, hours=4):
 
 async def message_signups_per_event(channel, eid: int, scraper: Scraper, emojis):
     """Send a message per event containing users that have signed up for the event"""
-    event = zwiftcom.get_event(eid)
-    event.get_signups(scraper)
+    event = await scraper.run(zwiftcom.get_event, eid)
+    await scraper.run(event.get_signups, scraper)
     embed = await event_embed(event=event, emojis=emojis)
     if 'Signups' in [field.name for field in embed.fields]:
         await channel.send(embed=embed)
@@ -269,7 +273,7 @@ class Zwift(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.emojis = None
-        self.scraper = get_scraper()
+        self.scraper = bot_scraper(bot)
         self.scheduled_signup_function.start()
         self.target = None
 
@@ -304,6 +308,7 @@ class Zwift(commands.Cog):
         await self.bot.wait_until_ready()
 
     @commands.Cog.listener("on_message")
+    @scheduler.prioritized(scheduler.INTERACTIVE)
     async def zwift_link_embed(self, message):
         if self.emojis is None:
             self.emojis = await message.guild.fetch_emojis()
@@ -316,8 +321,8 @@ class Zwift(commands.Cog):
         for m in eventlink.finditer(message.content):
             eid = int(m.group('eid'))
             secret = m.group('secret')
-            event = zwiftcom.get_event(eid, secret)
-            event.get_signups(self.scraper)
+            event = await self.scraper.run(zwiftcom.get_event, eid, secret)
+            await self.scraper.run(event.get_signups, self.scraper)
             embed = await event_embed(event, emojis=self.emojis)
             await message.reply(embed=embed)
         if channel.name == "bot-test":
@@ -332,12 +337,18 @@ class Zwift(commands.Cog):
                 )
 
     @commands.command(name='zwiftid', help='Searches zwiftid of name')
+    @scheduler.prioritized(scheduler.INTERACTIVE)
     async def zwift_id(self, ctx, *args):
-        zp = ctx.bot.get_cog('ZwiftPower')
         results = {}
-        for query, ids in (await self.zwift_id_lookup(ctx, *args)).items():
+        lookups = await self.zwift_id_lookup(ctx, *args)
+        found = [id_ for ids in lookups.values() if ids is not None and 0 < len(ids) <= 5 for id_ in ids]
+        errors = await self.scraper.prefetch_profiles(found, parts=('snapshot',))
+        for query, ids in lookups.items():
             if ids is not None and 0 < len(ids) <= 5:
-                results[query] = " / ".join(["{p.id} ({p.name})".format(p=zp.scraper.profile(id_)) for id_ in ids])
+                results[query] = " / ".join(["{p.id} ({name})".format(
+                    p=self.scraper.profile(id_),
+                    name="profile unavailable" if id_ in errors else self.scraper.profile(id_).name,
+                ) for id_ in ids])
             else:
                 results[query] = "Not found or too many results"
         await ctx.send("\n".join(["{0}: {1}".format(q, r) for q, r in results.items()]))
@@ -365,7 +376,8 @@ class Zwift(commands.Cog):
             except commands.errors.MemberNotFound:
                 pass
 
-            # See if we can find a match for the string on the ZP team
+            # See if we can find a match for the string on the ZP team. The roster is in memory, so no need to wait
+            # for a worker
             team_member_results = zp.find_team_member(query)
             if len(team_member_results) > 0:
                 results[query] = [p.id for p in team_member_results]
@@ -2,9 +2,10 @@ from datetime import timedelta
 from pathlib import Path
 
 from appdirs import user_cache_dir
-from requests import Session
 from requests_cache import CachedSession
 
+from .. import circuit, fastjson
+
 # These aren't defined in the Game dictionary
 worlds = {
     1: 'Watopia',
@@ -28,12 +29,16 @@ def retrieve_data(use_cache=True):
     if use_cache:
         cache_dir = Path(user_cache_dir('bakpdlbot'))
         cache_dir.mkdir(parents=True, exist_ok=True)
-        expire_after = timedelta(hours=12)
-        session = CachedSession(str(cache_dir / 'gd_cache'), expire_after=expire_after)
+        # The game dictionary only changes with game updates
+        expire_after = timedelta(days=1)
+        # Keep using the last copy while Zwift is unavailable
+        session = CachedSession(str(cache_dir / 'gd_cache'), expire_after=expire_after, stale_if_error=True)
+        adapter = circuit.BreakerAdapter(session.get_adapter(url), circuit.breaker)
+        session.mount('https://', adapter)
     else:
-        session = Session()
+        session = circuit.session()
     resp = session.get(url)
-    return resp.json()['GameDictionary']
+    return fastjson.response_json(resp)['GameDictionary']
 
 
 def sports(s):
@@ -3,13 +3,19 @@ import logging
 from abc import ABC
 
 import pendulum
-import requests
 
 from .const import worlds, routes
+from .. import circuit, fastjson
+from ..singleflight import SingleFlight
 from ..simple import get_userlist, get_eventsecrets
 
 logger = logging.getLogger(__name__)
 
+# Fails fast while the Zwift API is unavailable
+session = circuit.session()
+# Lookups of an event that is already being fetched wait for that request
+_flights = SingleFlight()
+
 def format_timestamp(v):
     return pendulum.parse(v)
 
@@ -124,10 +130,10 @@ def get_event(eid: int, secret: str = None) -> Event:
         params = {'eventSecret': secret}
     else:
         params = {}
-    resp = requests.get(url, params=params)
+    resp = _flights.do((url, secret), session.get, url, params=params)
     if resp.status_code == 403 and secret is None:
         eventsecrets = get_eventsecrets()
         for es in eventsecrets['eventsecrets'].tolist():
             return get_event(eid=eid, secret=es)
     resp.raise_for_status()
-    return Event(resp.json())
+    return Event(fastjson.response_json(resp))
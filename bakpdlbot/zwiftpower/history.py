@@ -0,0 +1,140 @@
+"""
+A rider's race history from ZwiftPower, and what kind of events the races were.
+"""
+from bisect import bisect_left
+from collections.abc import Sequence
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Union
+
+# Days on which the Zwift Racing League raced a TTT
+ZRL_TTT_DATES = frozenset([
+    # ZRL 20/21 Season 1
+    date(2020, 10, 19), date(2020, 10, 20),  # Week 2
+    date(2020, 11,  2), date(2020, 11,  3),  # Week 4
+    date(2020, 11, 16), date(2020, 11, 17),  # Week 6
+    date(2020, 11, 30), date(2020, 12,  1),  # Week 8
+    date(2020, 12, 15), date(2020, 12, 16),  # Week 10
+    # ZRL 20/21 Season 2
+    date(2021,  1, 18), date(2021,  1, 19),  # Week 2
+    date(2021,  2,  8), date(2021,  2,  9),  # Week 5
+    date(2021,  3,  1), date(2021,  3,  2),  # Week 8
+    # ZRL 20/21 Season 3
+    date(2021,  4,  6), date(2021,  4,  7),  # Week 1
+    date(2021,  4, 27), date(2021,  4, 28),  # Week 4
+    date(2021,  5, 18), date(2021,  5, 19),  # Week 7
+    date(2021,  6,  6), date(2021,  6,  7),  # Playoff TTT
+    # ZRL 21/22 Season 1
+    date(2021,  9, 28), date(2021,  9, 29),  # Week 1
+    date(2021, 10,  8), date(2021, 10,  9),  # Week 7
+    date(2021, 11, 23), date(2021, 11, 24),  # Playoff TTT
+    # ZRL 21/22 Season 2
+    date(2022,  2,  1), date(2022,  2,  2),  # Week 4
+    date(2022,  2, 22), date(2022,  2, 23),  # Week 7
+    date(2022,  3, 12), date(2022,  3, 13),  # Playoff TTT
+    # ZRL 21/22 Season 3
+    date(2022,  4, 12), date(2022,  4, 13),  # Week 2
+    date(2022,  5,  3), date(2022,  5,  4),  # Week 5
+    # ZRL 22/23 Round 1
+    date(2022,  9, 27), date(2022,  9, 28),  # Week 3
+    # ZRL 22/23 Round 2
+    date(2022, 11, 15), date(2022, 11, 16),  # Week 2
+    date(2022, 12,  6), date(2022, 12,  7),  # Week 5
+    # ZRL 22/23 Round 3
+    date(2023,  1, 17), date(2023,  1, 18),  # Week 2
+    date(2023,  2,  7), date(2023,  2,  8),  # Week 5
+    # ZRL 23/24 Round 1
+    date(2023,  9, 26), date(2023,  9, 27),  # Week 3
+    date(2023, 10, 17), date(2023, 10, 18),  # Week 3
+    # ZRL 23/24 Round 2
+    date(2023, 11, 28), date(2023, 11, 29),  # Week 3
+    date(2023, 12, 19), date(2023, 12, 20),  # Week 3
+    # ZRL 23/24 Round 3
+    date(2024,  2,  6), date(2024,  2,  7),  # Week 3
+    date(2024,  2, 27), date(2024,  2, 28),  # Week 3
+    # ZRL 24/25 Round 1
+    date(2024,  9, 10), date(2024,  9, 11),  # Week 1
+    date(2024, 10,  1), date(2024, 10,  2),  # Week 4
+])
+
+
+def is_race(race: Dict) -> bool:
+    return 'TYPE_RACE' in race.get('f_t', '')
+
+
+def is_zrl(race: Dict) -> bool:
+    return 'Zwift Racing League'.lower() in race.get('event_title', '').lower()
+
+
+def is_zrl_ttt(race: Dict) -> bool:
+    if not is_zrl(race):
+        return False
+    race_date = datetime.fromtimestamp(race['event_date'], timezone.utc).date()
+    return race_date in ZRL_TTT_DATES
+
+
+def is_wtrl_ttt(race: Dict) -> bool:
+    return 'WTRL Team Time Trial' in race.get('event_title', '')
+
+
+def is_frr_ttt(race: Dict) -> bool:
+    title = race.get('event_title', '')
+    return 'FRR' in title and 'TTT' in title
+
+
+def is_ttt(race: Dict) -> bool:
+    return is_wtrl_ttt(race) or is_zrl_ttt(race) or is_frr_ttt(race)
+
+
+Moment = Union[int, float, date, datetime]
+
+
+def _timestamp(moment: Moment) -> float:
+    if isinstance(moment, datetime):
+        return moment.timestamp()
+    if isinstance(moment, date):
+        return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc).timestamp()
+    return moment
+
+
+class RaceHistory(Sequence):
+    """
+    The races of one rider (``profile/{id}_all.json``), oldest first.
+
+    Built once per profile: the races are sorted by ``event_date`` and classified up front, so the latest race,
+    date windows and the race/TTT/ZRL subsets don't go through the whole history again. Races without a date are
+    left out.
+    """
+
+    def __init__(self, races: List[Dict]):
+        self._races = sorted((r for r in races if r.get('event_date') != ''), key=lambda r: r['event_date'])
+        self._dates = [r['event_date'] for r in self._races]
+        self.races = [r for r in self._races if is_race(r)]
+        self.ttts = [r for r in self._races if is_ttt(r)]
+        self.zrl = [r for r in self._races if is_zrl(r)]
+
+    def __getitem__(self, item):
+        return self._races[item]
+
+    def __len__(self):
+        return len(self._races)
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return list(self) == list(other)
+        return NotImplemented
+
+    @property
+    def latest(self) -> Optional[Dict]:
+        return self._races[-1] if self._races else None
+
+    def between(self, start: Moment = None, end: Moment = None) -> List[Dict]:
+        """Races from ``start`` up to, but not including, ``end``. Dates are taken as midnight UTC."""
+        lo = 0 if start is None else bisect_left(self._dates, _timestamp(start))
+        hi = len(self._dates) if end is None else bisect_left(self._dates, _timestamp(end))
+        return self._races[lo:hi]
+
+    def since(self, start: Moment) -> List[Dict]:
+        return self.between(start=start)
+
+    def __repr__(self):
+        return "<{} {} races>".format(type(self).__name__, len(self))
@@ -0,0 +1,122 @@
+"""
+Incremental decoding of the big ZwiftPower JSON files.
+
+The race files in ``cache3/results`` are one object with a ``data`` array of thousands of riders. Decoding them with
+``json.loads`` builds every row at once; :func:`iter_items` instead decodes the array one element at a time from the
+response chunks, so only the current element (and the chunk it's in) is alive at any time.
+"""
+import codecs
+import json
+from typing import Iterable, Iterator, Optional
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = ',:]}'
+
+
+class _Reader:
+    """Text buffer over an iterable of byte chunks, read further only when the parser runs out"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self) -> bool:
+        """Append the next chunk to the buffer, dropping what has been consumed. False at the end of the input."""
+        if self.eof:
+            return False
+        self.buf = self.buf[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.buf += self._utf8.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, without consuming it. Empty at the end of the input."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.more():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise json.JSONDecodeError("Expecting {!r}".format(char), self.buf, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # A value is only complete once its delimiter has been read: a number like ``-6.5e3`` may continue
+            # in the next chunk
+            follow = end
+            while follow < len(self.buf) and self.buf[follow] in _WHITESPACE:
+                follow += 1
+            if (follow == len(self.buf) or self.buf[follow] not in _DELIMITERS) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def _array(reader: _Reader) -> Iterator:
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        if reader.peek() == ',':
+            reader.pos += 1
+            continue
+        reader.expect(']')
+        return
+
+
+def iter_items(chunks: Iterable[bytes], key: Optional[str] = 'data', fields: Iterable[str] = None) -> Iterator:
+    """
+    Decode the elements of a JSON array one by one.
+
+    :param chunks: The document in pieces, e.g. ``response.iter_content(65536)``
+    :param key: Key of the array in the top-level object. Use ``None`` if the document is the array itself.
+    :param fields: If given, the elements are objects and only these keys are kept (missing ones become ``None``)
+    :raises KeyError: If the top-level object doesn't have ``key``
+    """
+    reader = _Reader(chunks)
+    if key is None:
+        items = _array(reader)
+    else:
+        items = None
+        reader.expect('{')
+        while reader.peek() != '}':
+            name = reader.value()
+            reader.expect(':')
+            if name == key:
+                items = _array(reader)
+                break
+            reader.value()
+            if reader.peek() == ',':
+                reader.pos += 1
+        if items is None:
+            raise KeyError(key)
+    if fields is None:
+        yield from items
+    else:
+        fields = tuple(fields)
+        for item in items:
+            yield {field: item.get(field) for field in fields}
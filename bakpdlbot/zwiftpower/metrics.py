@@ -0,0 +1,165 @@
+"""
+Counters and latency histograms for the requests a Scraper makes.
+
+Requests are grouped by the URL template they were made from (``Profile.URL_CP``, ``Race.URL_SIGNUPS``, ...), so
+it's easy to see which kind of request a slow command is waiting for, how often it came from the cache, and how
+much of the time went into politeness waits.
+"""
+import re
+import threading
+from bisect import bisect_left
+from typing import Dict, Iterable, Tuple
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+# How a request was answered
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+REVALIDATED = 'revalidated'
+# Waited for an identical request that was already in flight, and got its response
+SHARED = 'shared'
+ERROR = 'error'
+OUTCOMES = (HIT, MISS, STALE, REVALIDATED, SHARED, ERROR)
+
+OTHER = 'other'
+
+
+class Histogram:
+    """Request durations counted in :data:`BUCKETS`"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket the ``q``-th percentile falls in"""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return BUCKETS[-1]
+
+    def as_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'total': self.total,
+            'buckets': dict(zip(BUCKETS, self.counts)),
+        }
+
+
+class Endpoint:
+    def __init__(self):
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.latency = Histogram()
+        self.waits = 0
+        self.waited = 0.0
+
+
+def template_pattern(template: str):
+    """Regex matching the URLs made from a template like ``Profile.URL_CP``"""
+    return re.compile('[^&/?]*'.join(map(re.escape, re.split(r'{[a-z_]+}', template))) + '$')
+
+
+class Metrics:
+    """
+    Thread-safe request metrics for one Scraper.
+
+    :param endpoints: ``(name, URL template)`` pairs to group requests by. Anything else counts as ``other``.
+    """
+
+    def __init__(self, endpoints: Iterable[Tuple[str, str]] = ()):
+        self._patterns = [(name, template_pattern(template)) for name, template in endpoints]
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints: Dict[str, Endpoint] = {}
+            self.logins = 0
+
+    def endpoint(self, url: str) -> str:
+        for name, pattern in self._patterns:
+            if pattern.match(url):
+                return name
+        return OTHER
+
+    def _get(self, url: str) -> Endpoint:
+        name = self.endpoint(url)
+        if name not in self._endpoints:
+            self._endpoints[name] = Endpoint()
+        return self._endpoints[name]
+
+    def record_request(self, url: str, outcome: str, seconds: float):
+        with self._lock:
+            endpoint = self._get(url)
+            endpoint.outcomes[outcome] += 1
+            endpoint.latency.observe(seconds)
+
+    def record_wait(self, url: str, seconds: float):
+        """Time spent waiting for the rate limiter before sending a request"""
+        with self._lock:
+            endpoint = self._get(url)
+            endpoint.waits += 1
+            endpoint.waited += seconds
+
+    def record_login(self):
+        with self._lock:
+            self.logins += 1
+
+    def snapshot(self) -> Dict:
+        """
+        All metrics as plain data::
+
+            {'logins': 1, 'endpoints': {'Profile.URL_CP': {'requests': 12, 'hit': 9, ..., 'hit_ratio': 0.75,
+             'waits': 2, 'waited': 1.5, 'latency': {'count': 12, 'total': 3.2, 'buckets': {0.005: 4, ...}}}}}
+        """
+        with self._lock:
+            endpoints = {}
+            for name, endpoint in self._endpoints.items():
+                requests = endpoint.latency.count
+                data = {'requests': requests}
+                data.update(endpoint.outcomes)
+                for outcome in (HIT, MISS, STALE):
+                    data[outcome + '_ratio'] = endpoint.outcomes[outcome] / requests if requests else 0.0
+                data['waits'] = endpoint.waits
+                data['waited'] = endpoint.waited
+                data['latency'] = endpoint.latency.as_dict()
+                endpoints[name] = data
+            return {'logins': self.logins, 'endpoints': endpoints}
+
+    def format(self) -> str:
+        """A text table for the bot"""
+        with self._lock:
+            lines = ["{:<24}{:>6}{:>6}{:>6}{:>6}{:>6}{:>7}{:>5}{:>8}{:>8}{:>8}".format(
+                'endpoint', 'reqs', 'hit', 'miss', 'stale', 'reval', 'shared', 'err', 'p50', 'p95', 'wait')]
+            total_waited = 0.0
+            for name in sorted(self._endpoints):
+                endpoint = self._endpoints[name]
+                o = endpoint.outcomes
+                lines.append("{:<24}{:>6}{:>6}{:>6}{:>6}{:>6}{:>7}{:>5}{:>8}{:>8}{:>7.1f}s".format(
+                    name, endpoint.latency.count, o[HIT], o[MISS], o[STALE], o[REVALIDATED], o[SHARED], o[ERROR],
+                    _duration(endpoint.latency.percentile(50)), _duration(endpoint.latency.percentile(95)),
+                    endpoint.waited))
+                total_waited += endpoint.waited
+            lines.append("Logins: {}, waited for the rate limit: {:.1f}s".format(self.logins, total_waited))
+            return "\n".join(lines)
+
+
+def _duration(bound: float) -> str:
+    if bound == float('inf'):
+        return '>{:g}s'.format(BUCKETS[-2])
+    if bound < 1:
+        return '{:g}ms'.format(bound * 1000)
+    return '{:g}s'.format(bound)
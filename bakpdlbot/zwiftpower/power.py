@@ -0,0 +1,211 @@
+"""
+Critical power curves from ZwiftPower.
+
+The ``api3.php?do=critical_power_profile`` payload has, for every window (``90days``, ``30days``, ...), a list of
+``{x: duration, y: value}`` points. :class:`CriticalPowerCurve` turns that into sorted NumPy arrays once, so
+templates can read values at any duration without rebuilding dicts, while ``curve['90days'][300]`` keeps working.
+:class:`PowerMatrix` lines up the curves of a group of riders for comparisons across the group.
+"""
+import warnings
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+class CurveWindow(Mapping):
+    """
+    The curve of one window: a read-only ``{duration: value}`` mapping over two arrays, named like in the payload:
+    ``x`` holds the durations in seconds, sorted, and ``y`` the values.
+
+    Indexing only finds durations ZwiftPower has a point for, like the dict it replaces; :meth:`at` interpolates
+    anywhere between the first and last point.
+    """
+    __slots__ = ('x', 'y', '_integral')
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, integral: bool = False):
+        self.x = x
+        self.y = y
+        # Watts come as ints; hand them out as ints so templates and CSV exports print them as before
+        self._integral = integral
+
+    @classmethod
+    def from_points(cls, points) -> 'CurveWindow':
+        by_duration = {}
+        for p in points:
+            if p.get('x') is not None and p.get('y') is not None:
+                by_duration[int(p['x'])] = p['y']
+        x = np.array(sorted(by_duration), dtype=np.int64)
+        y = np.array([float(by_duration[d]) for d in x.tolist()], dtype=np.float64)
+        integral = all(isinstance(v, int) for v in by_duration.values())
+        return cls(x, y, integral)
+
+    def _index(self, duration) -> int:
+        i = int(np.searchsorted(self.x, duration))
+        if i == len(self.x) or self.x[i] != duration:
+            raise KeyError(duration)
+        return i
+
+    def _value(self, value: float):
+        return int(value) if self._integral else float(value)
+
+    def __getitem__(self, duration):
+        return self._value(self.y[self._index(duration)])
+
+    def __contains__(self, duration):
+        try:
+            self._index(duration)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.x.tolist())
+
+    def __len__(self):
+        return len(self.x)
+
+    def at(self, duration: float) -> Optional[float]:
+        """
+        Value at any duration, interpolated linearly in log(duration) between the neighbouring points.
+
+        :return: ``None`` outside the range of the curve
+        """
+        if len(self.x) == 0 or not self.x[0] <= duration <= self.x[-1]:
+            return None
+        i = int(np.searchsorted(self.x, duration))
+        if self.x[i] == duration:
+            return float(self.y[i])
+        x0, x1 = np.log(self.x[i - 1:i + 1])
+        y0, y1 = self.y[i - 1:i + 1]
+        return float(y0 + (y1 - y0) * (np.log(duration) - x0) / (x1 - x0))
+
+    def __repr__(self):
+        return "<{} {} points>".format(type(self).__name__, len(self))
+
+
+class CriticalPowerCurve(Mapping):
+    """Read-only ``{window: CurveWindow}`` mapping for one rider and one unit (watts or w/kg)"""
+
+    def __init__(self, windows: Dict[str, CurveWindow]):
+        self.windows = windows
+
+    @classmethod
+    def from_json(cls, payload: Dict) -> 'CriticalPowerCurve':
+        efforts = (payload or {}).get('efforts') or {}
+        return cls({window: CurveWindow.from_points(points) for window, points in efforts.items()})
+
+    def __getitem__(self, window: str) -> CurveWindow:
+        return self.windows[window]
+
+    def __iter__(self):
+        return iter(self.windows)
+
+    def __len__(self):
+        return len(self.windows)
+
+    def at(self, duration: float, window: str = '90days') -> Optional[float]:
+        """Interpolated value at ``duration`` in ``window``, ``None`` if there is no data there"""
+        curve = self.windows.get(window)
+        return None if curve is None else curve.at(duration)
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, ", ".join(self.windows))
+
+
+class PowerMatrix:
+    """
+    Critical power of a group of riders side by side: a riders × durations matrix per unit, for team and race
+    reports.
+
+    ``values[unit][i, j]`` is the 90 day (or ``window``) power of ``riders[i]`` at ``durations[j]``, interpolated
+    where ZwiftPower has no point at exactly that duration. Riders without data there are ``NaN`` and ``False`` in
+    ``mask[unit]``; all statistics leave them out. Results per duration are ``{duration: value}`` dicts, with
+    ``None`` where no rider has data.
+    """
+    UNITS = ('watts', 'wkg')
+
+    def __init__(self, riders, durations, window: str = '90days'):
+        """
+        :param riders: Profiles, or anything with a ``profile`` (team members, race entrants)
+        :param durations: Durations in seconds
+        """
+        self.riders = list(riders)
+        self.durations = np.array(list(durations), dtype=np.int64)
+        self.window = window
+        self.values = {}
+        self.mask = {}
+        for unit in self.UNITS:
+            values = np.full((len(self.riders), len(self.durations)), np.nan)
+            for i, rider in enumerate(self.riders):
+                curve = self._curve(rider, unit)
+                if curve is not None:
+                    values[i] = [np.nan if v is None else v for v in map(curve.at, self.durations.tolist())]
+            self.values[unit] = values
+            self.mask[unit] = ~np.isnan(values)
+
+    def _curve(self, rider, unit) -> Optional[CurveWindow]:
+        profile = getattr(rider, 'profile', rider)
+        cp = profile.cp_watts if unit == 'watts' else profile.cp_wkg
+        return None if cp is None else cp.get(self.window)
+
+    def _per_duration(self, row: np.ndarray) -> Dict[int, Optional[float]]:
+        return {d: None if np.isnan(v) else float(v) for d, v in zip(self.durations.tolist(), row)}
+
+    def _reduce(self, fn, unit, *args):
+        if not self.riders:
+            # nanmin and nanmax have nothing to start from, unlike the other reductions
+            return {d: None for d in self.durations.tolist()}
+        with warnings.catch_warnings():
+            # Durations nobody has data for come out as NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return self._per_duration(fn(self.values[unit], *args, axis=0))
+
+    def min(self, unit: str = 'wkg') -> Dict[int, Optional[float]]:
+        return self._reduce(np.nanmin, unit)
+
+    def max(self, unit: str = 'wkg') -> Dict[int, Optional[float]]:
+        return self._reduce(np.nanmax, unit)
+
+    def median(self, unit: str = 'wkg') -> Dict[int, Optional[float]]:
+        return self._reduce(np.nanmedian, unit)
+
+    def percentile(self, q: float, unit: str = 'wkg') -> Dict[int, Optional[float]]:
+        """:param q: Percentile between 0 and 100"""
+        return self._reduce(np.nanpercentile, unit, q)
+
+    def _index(self, duration: int) -> int:
+        matches = np.flatnonzero(self.durations == duration)
+        if len(matches) == 0:
+            raise KeyError(duration)
+        return int(matches[0])
+
+    def column(self, duration: int, unit: str = 'wkg') -> List[Tuple[object, float]]:
+        """``(rider, value)`` for every rider with data at ``duration``, in rider order"""
+        j = self._index(duration)
+        rows = np.flatnonzero(self.mask[unit][:, j])
+        return [(self.riders[i], float(self.values[unit][i, j])) for i in rows]
+
+    def rank(self, duration: int, unit: str = 'wkg') -> List[Tuple[object, float]]:
+        """Like :meth:`column`, strongest first"""
+        j = self._index(duration)
+        rows = np.flatnonzero(self.mask[unit][:, j])
+        order = rows[np.argsort(-self.values[unit][rows, j], kind='stable')]
+        return [(self.riders[i], float(self.values[unit][i, j])) for i in order]
+
+    def weakest(self, unit: str = 'wkg') -> Dict[int, Optional[Tuple[object, float]]]:
+        """
+        ``(rider, value)`` with the lowest value at each duration, e.g. who sets the pace a TTT team can hold.
+        ``None`` where no rider has data.
+        """
+        values = np.where(self.mask[unit], self.values[unit], np.inf)
+        lowest = np.argmin(values, axis=0) if len(self.riders) else np.zeros(len(self.durations), dtype=int)
+        has_data = self.mask[unit].any(axis=0)
+        return {d: (self.riders[i], float(values[i, j])) if ok else None
+                for j, (d, i, ok) in enumerate(zip(self.durations.tolist(), lowest.tolist(), has_data.tolist()))}
+
+    def __len__(self):
+        return len(self.riders)
+
+    def __repr__(self):
+        return "<{} {} riders × {} durations>".format(type(self).__name__, len(self.riders), len(self.durations))
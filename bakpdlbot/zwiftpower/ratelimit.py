@@ -0,0 +1,172 @@
+"""
+Politeness limits for requests to ZwiftPower.
+
+All Scrapers in the process share :data:`limiter`, so the bot cogs and the riderlist templates together stay
+under the rate the site tolerates. Requests served from the cache never reach the transport adapter, so they
+don't use up any tokens. Neither do revalidations that ZwiftPower answers with ``304 Not Modified``.
+
+Interactive requests (see :mod:`.scheduler`) reserve the next free slot of a bucket. Everything else waits for a
+token nobody reserved, so a ``!cp`` during a background sync waits for one token at most, not for every request the
+busy workers are already lined up for.
+"""
+import logging
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlparse
+
+from requests.adapters import BaseAdapter
+
+from . import scheduler
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: on average ``rate`` requests per second, with bursts of up to ``burst`` requests
+    after an idle period.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be positive and burst at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        Take a token, going into debt if there is none.
+
+        :return: The number of seconds the caller has to wait before its reserved slot
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def take(self) -> float:
+        """
+        Take a token if there is one, without going into debt.
+
+        :return: ``0`` if a token was taken, else the number of seconds until there is one
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, reserve: bool = True) -> float:
+        """
+        Block until a token is available.
+
+        :param reserve: Reserve the next free slot. Otherwise wait for a token nobody reserved, so callers that do
+                        reserve meanwhile go first.
+        :return: The number of seconds spent waiting
+        """
+        if reserve:
+            wait = self.reserve()
+            if wait > 0:
+                time.sleep(wait)
+            return wait
+        waited = 0.0
+        while True:
+            wait = self.take()
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """
+    Picks the token bucket for a URL: the static ``cache3/*.json`` files are cheap for ZwiftPower to serve and
+    get their own, more generous bucket. Anything not on ZwiftPower (e.g. the Zwift login pages) isn't limited.
+    """
+    HOST = 'zwiftpower.com'
+    PAGES = 'pages'
+    STATIC = 'static'
+    # Priority classes whose requests reserve the next free slot, see TokenBucket.acquire()
+    RESERVE_AHEAD = (scheduler.INTERACTIVE,)
+
+    def __init__(self, pages: TokenBucket = None, static: TokenBucket = None):
+        self.buckets = {
+            self.PAGES: pages if pages is not None else TokenBucket(rate=1.0, burst=5),
+            self.STATIC: static if static is not None else TokenBucket(rate=4.0, burst=10),
+        }
+
+    def bucket_for(self, url: str):
+        parsed = urlparse(url)
+        host = parsed.hostname or ''
+        if host != self.HOST and not host.endswith('.' + self.HOST):
+            return None
+        if parsed.path.startswith('/cache3/'):
+            return self.buckets[self.STATIC]
+        return self.buckets[self.PAGES]
+
+    def configure(self, bucket: str, rate: float, burst: int = None):
+        """Replace one of the buckets, e.g. to be gentler during a bulk export"""
+        old = self.buckets[bucket]
+        self.buckets[bucket] = TokenBucket(rate=rate, burst=old.burst if burst is None else burst)
+
+    def acquire(self, url: str) -> float:
+        bucket = self.bucket_for(url)
+        if bucket is None:
+            return 0.0
+        waited = bucket.acquire(reserve=scheduler.current() in self.RESERVE_AHEAD)
+        if waited > 0:
+            logger.debug("Waited %.2fs before %s", waited, url)
+        return waited
+
+    def charge(self, url: str):
+        """Take a token for a request that has already been sent, without waiting"""
+        bucket = self.bucket_for(url)
+        if bucket is not None:
+            bucket.reserve()
+
+
+class ThrottledAdapter(BaseAdapter):
+    """
+    Transport adapter that takes a token from the limiter before handing the request to ``inner``.
+
+    Conditional requests (requests-cache revalidating an expired entry with ``If-None-Match`` or
+    ``If-Modified-Since``) are sent straight away: a ``304`` costs ZwiftPower next to nothing, so only a full
+    answer is charged to the bucket, after the fact.
+    """
+    CONDITIONAL = ('If-None-Match', 'If-Modified-Since')
+
+    def __init__(self, inner: BaseAdapter, limiter: RateLimiter, on_wait: Callable[[str, float], None] = None):
+        """
+        :param on_wait: Called with the URL and the number of seconds waited, whenever a request had to wait
+        """
+        super().__init__()
+        self.inner = inner
+        self.limiter = limiter
+        self.on_wait = on_wait
+
+    def send(self, request, **kwargs):
+        if not any(h in request.headers for h in self.CONDITIONAL):
+            waited = self.limiter.acquire(request.url)
+            if waited > 0 and self.on_wait is not None:
+                self.on_wait(request.url, waited)
+            return self.inner.send(request, **kwargs)
+        resp = self.inner.send(request, **kwargs)
+        if resp.status_code != 304:
+            self.limiter.charge(request.url)
+        return resp
+
+    def close(self):
+        self.inner.close()
+
+
+# Shared by every Scraper in the process
+limiter = RateLimiter()
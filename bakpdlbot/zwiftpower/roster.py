@@ -0,0 +1,112 @@
+"""
+A team's members, kept up to date in the background.
+
+Name lookups (``!zwiftid``, ``!cp``) search a :class:`RosterIndex` that was built ahead of time, so they never wait
+for ZwiftPower. :meth:`Roster.refresh` fetches the roster again and swaps a new index in whole (a lookup sees
+either the old roster or the new one, never half of each), then prewarms the profiles of riders that joined.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import scheduler, store
+from .scraper import Member, Profile, Scraper
+
+logger = logging.getLogger(__name__)
+
+
+class RosterChanges(NamedTuple):
+    joined: List[Member]
+    left: List[Member]
+    # (old name, member under the new name)
+    renamed: List[Tuple[str, Member]]
+
+    def __bool__(self):
+        return bool(self.joined or self.left or self.renamed)
+
+    def __str__(self):
+        parts = ["{} joined".format(m.name) for m in self.joined]
+        parts += ["{} left".format(m.name) for m in self.left]
+        parts += ["{} is now {}".format(old, m.name) for old, m in self.renamed]
+        return ", ".join(parts) or "no changes"
+
+
+class RosterIndex:
+    """The members of a team at one point in time, searchable by name. Not changed after it's built."""
+
+    def __init__(self, members: Iterable[Member] = ()):
+        self.members = tuple(members)
+        self.by_id: Dict[str, Member] = {str(m.id): m for m in self.members}
+        self._names = [((m.name or '').lower(), m) for m in self.members]
+
+    @classmethod
+    def from_json(cls, riders_json: Dict, scraper: Scraper, team=None) -> 'RosterIndex':
+        """:param riders_json: The team roster as returned by ZwiftPower, see ``Team.riders_json``"""
+        return cls(Member(r, scraper=scraper, container=team) for r in riders_json['data'])
+
+    def __len__(self):
+        return len(self.members)
+
+    def find(self, q: str) -> List[Member]:
+        """Members whose name is ``q``, or else starts with it, or else contains it. Case-insensitive."""
+        q = q.lower()
+        for kind, match in (('exact', str.__eq__), ('startswith', str.startswith), ('contains', str.__contains__)):
+            matches = [m for name, m in self._names if match(name, q)]
+            if matches:
+                logger.debug("Found match(es) with %s for <%s>", kind, q)
+                return matches
+        return []
+
+    def diff(self, newer: 'RosterIndex') -> RosterChanges:
+        """What changed going from this roster to ``newer``"""
+        return RosterChanges(
+            joined=[m for id_, m in newer.by_id.items() if id_ not in self.by_id],
+            left=[m for id_, m in self.by_id.items() if id_ not in newer.by_id],
+            renamed=[(self.by_id[id_].name, m) for id_, m in newer.by_id.items()
+                     if id_ in self.by_id and self.by_id[id_].name != m.name],
+        )
+
+
+class Roster:
+    """
+    The roster of one team, refreshed with :meth:`refresh` (e.g. from a task loop, every :attr:`REFRESH_EVERY`).
+
+    Until the first refresh, the index is the roster kept in the scraper's store from an earlier run, whatever its
+    age, or empty.
+    """
+    REFRESH_EVERY = timedelta(hours=1)
+    # Loaded for riders that join, so their first lookup is as quick as anyone else's
+    PREWARM_PARTS = ('snapshot',)
+
+    def __init__(self, scraper: Scraper, team_id: int):
+        self.scraper = scraper
+        self.team = scraper.team(team_id)
+        # When the index was last swapped in by refresh()
+        self.refreshed: Optional[datetime] = None
+        self.index = RosterIndex()
+        if scraper.store is not None:
+            stored = scraper.store.get(store.TEAM, team_id, 'riders', max_age=timedelta.max)
+            if stored is not None:
+                self.index = RosterIndex.from_json(stored, scraper, self.team)
+
+    def find(self, q: str) -> List[Profile]:
+        """Profiles of the members matching ``q``, see :meth:`RosterIndex.find`. Never fetches the roster."""
+        return [m.profile for m in self.index.find(q)]
+
+    @scheduler.prioritized(scheduler.BACKGROUND)
+    async def refresh(self) -> RosterChanges:
+        """Fetch the roster again and swap it in, then prewarm the profiles of new members"""
+        riders_json = await self.scraper.run(self.team.refresh_riders)
+        newer = RosterIndex.from_json(riders_json, self.scraper, self.team)
+        changes = self.index.diff(newer)
+        # A single assignment: lookups running meanwhile keep using the old index. New members can be found right
+        # away; prewarming a whole team after a first start takes minutes under the rate limits.
+        self.index = newer
+        self.refreshed = datetime.now()
+        if changes:
+            logger.info("Roster of team %s: %s", self.team.id, changes)
+        if changes.joined:
+            errors = await self.scraper.sync_profiles([m.id for m in changes.joined], parts=self.PREWARM_PARTS)
+            for id_, e in errors.items():
+                logger.warning("Could not prewarm profile %s: %r", id_, e)
+        return changes
@@ -0,0 +1,146 @@
+"""
+Priority classes for the Scraper's worker pool.
+
+Everything the bot fetches goes through the same few workers and rate limiter, so a bulk job (the signup sweep
+over every tracked rider, a team export) would make someone waiting for ``!cp`` in Discord queue behind hundreds of
+profiles. Work is submitted under one of three classes, read from the context of the caller::
+
+    with scheduler.priority(scheduler.INTERACTIVE):
+        await scraper.prefetch_profiles(ids)
+
+or with the :func:`prioritized` decorator on a command.
+
+Free workers pick the next job by stride scheduling over :data:`SHARES`: when every class has work queued,
+interactive jobs get 6 of every 10 workers that free up, normal ones 3 and background ones 1, so a busy class can't
+starve the others. A class that had nothing queued doesn't save up its share, and ties go to the more interactive
+class, so an interactive job after a quiet spell goes ahead of everything already queued.
+"""
+import contextlib
+import contextvars
+import functools
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Dict
+
+INTERACTIVE = 'interactive'
+NORMAL = 'normal'
+BACKGROUND = 'background'
+# Relative share of the workers for each class, most interactive first
+SHARES = {INTERACTIVE: 6, NORMAL: 3, BACKGROUND: 1}
+
+_priority = contextvars.ContextVar('scraper_priority', default=NORMAL)
+
+
+def current() -> str:
+    """The priority class work submitted from here runs under"""
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def priority(cls: str):
+    """Submit the work of this block (and of the tasks it starts) under priority class ``cls``"""
+    if cls not in SHARES:
+        raise ValueError("Unknown priority class {!r}".format(cls))
+    token = _priority.set(cls)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def prioritized(cls: str):
+    """Decorator running a coroutine function (e.g. a bot command) under priority class ``cls``"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with priority(cls):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class PriorityExecutor(Executor):
+    """
+    Thread pool running jobs by priority class, with a fair share for each class. :meth:`submit` uses the class
+    of the caller's context, see :func:`priority`.
+    """
+
+    def __init__(self, max_workers: int, shares: Dict[str, float] = None, thread_name_prefix: str = 'scheduler'):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self.shares = dict(SHARES if shares is None else shares)
+        self._thread_name_prefix = thread_name_prefix
+        self._queues = {cls: deque() for cls in self.shares}
+        # Stride scheduling: the class with the lowest pass goes next, and advances by 1 / share
+        self._passes = dict.fromkeys(self.shares, 0.0)
+        self._now = 0.0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._shutdown = False
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        return self.submit_as(current(), fn, *args, **kwargs)
+
+    def submit_as(self, cls: str, fn, *args, **kwargs) -> Future:
+        """Submit ``fn`` under priority class ``cls``, regardless of the caller's context"""
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            queue = self._queues[cls]
+            if not queue:
+                self._passes[cls] = max(self._passes[cls], self._now)
+            queue.append((future, fn, args, kwargs))
+            if len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name='{}_{}'.format(self._thread_name_prefix, len(self._threads)))
+                self._threads.append(thread)
+                thread.start()
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        cls = min((c for c, q in self._queues.items() if q), key=self._passes.__getitem__)
+        self._now = self._passes[cls]
+        self._passes[cls] += 1 / self.shares[cls]
+        return cls, self._queues[cls].popleft()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._shutdown and not any(self._queues.values()):
+                    self._cond.wait()
+                if not any(self._queues.values()):
+                    return
+                cls, (future, fn, args, kwargs) = self._next()
+            if not future.set_running_or_notify_cancel():
+                continue
+            # Work the job submits itself keeps its class
+            token = _priority.set(cls)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                _priority.reset(token)
+
+    def queued(self) -> Dict[str, int]:
+        """Number of jobs waiting for a worker, per class"""
+        with self._cond:
+            return {cls: len(queue) for cls, queue in self._queues.items()}
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for queue in self._queues.values():
+                    while queue:
+                        queue.popleft()[0].cancel()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
@@ -1,22 +1,38 @@
 import abc
+import asyncio
 import contextlib
+import functools
+import inspect
+import json
 import logging
 import re
 import time
 import traceback
 import os
-from typing import Iterator, List
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 from html import unescape
-from datetime import datetime, timedelta
-# from pathlib import Path
-# from requests_cache import CachedSession
-# from appdirs import user_cache_dir
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from requests_cache import CachedSession
+from requests_cache.policy.expiration import get_url_expiration
+from appdirs import user_cache_dir
 
 import demjson3 as demjson
 import requests_html
-from requests import Response, Session
+from requests import Request, Response, Session
+from requests.cookies import create_cookie
+from requests.adapters import BaseAdapter, HTTPAdapter
 from urllib.parse import urlparse, parse_qs
 
+from .. import circuit, fastjson
+from ..singleflight import SingleFlight
+from . import jsonstream, metrics, ratelimit, scheduler, store
+from .history import RaceHistory
+from .power import CriticalPowerCurve
+
 logger = logging.getLogger(__name__)
 
 # Flag<=>Country as used by ZwiftPower. Probably incomplete.
@@ -242,9 +258,63 @@ def html(resp: Response):
 
 
 class Fetchable(abc.ABC):
+    # Lazy properties fetched by :meth:`load` when no parts are given
+    PARTS = ('html',)
+    # What the scraper's RiderStore keeps this object's fields under
+    STORE_KIND = None
 
     def __init__(self, scraper):
         self.scraper = scraper
+        self.created = time.monotonic()
+
+    async def load(self, *parts):
+        """
+        Fetch the given lazy properties on the scraper's worker pool, without blocking the event loop.
+
+        The parts are fetched concurrently; afterwards the properties can be read without any network access.
+        :param parts: Names of the properties to load, e.g. ``'html'``, ``'cp_wkg'``. Defaults to :attr:`PARTS`
+        :return: self
+        """
+        await asyncio.gather(*[self.scraper.run(getattr, self, part) for part in (parts or self.PARTS)])
+        return self
+
+    def _stored(self, field: str, fetch: Callable, keep: Callable = None):
+        """
+        ``field`` from the scraper's :class:`~store.RiderStore` if it's fresh there, otherwise the JSON-able result
+        of ``fetch()``, which is stored unless ``keep(value)`` says otherwise, or it came from an expired cached
+        response. While ZwiftPower is unavailable a stored value of any age is used.
+        """
+        rider_store = getattr(self.scraper, 'store', None)
+        if rider_store is None:
+            return fetch()
+        value = rider_store.get(self.STORE_KIND, self.id, field)
+        if value is not None:
+            return value
+        stale = self.scraper.stale_served()
+        try:
+            value = fetch()
+        except Exception as e:
+            if circuit.is_outage(e):
+                value = rider_store.get(self.STORE_KIND, self.id, field, max_age=timedelta.max)
+                if value is not None:
+                    logger.warning("Using stored %s of %s %s: %r", field, self.STORE_KIND, self.id, e)
+                    return value
+            raise
+        if self.scraper.stale_served() != stale:
+            # Old data from the HTTP cache; storing it as just fetched would hide the refresh
+            return value
+        if keep is None or keep(value):
+            rider_store.put(self.STORE_KIND, self.id, field, value)
+        return value
+
+    @staticmethod
+    def _expired(loaded_at: Optional[float], url: str) -> bool:
+        """
+        Whether data loaded from ``url`` at ``loaded_at`` (``time.monotonic()``) is older than the HTTP cache keeps
+        it, for data that changes faster than the object holding it is replaced, see ``Scraper.FRESHNESS``
+        """
+        expire_after = get_url_expiration(url, URLS_EXPIRE_AFTER) or EXPIRE_AFTER
+        return loaded_at is None or time.monotonic() - loaded_at > expire_after.total_seconds()
 
     def _get(self, selector):
         return self.html.find(selector, first=True)
@@ -260,11 +330,8 @@ class Fetchable(abc.ABC):
 
 
 class Rider:
-    def __init__(self, rider_data, scraper, container):
-        self.data = rider_data
-        self.scraper = scraper
-        self.container = container
-        self._profile = None
+    """A rider in a team or a race. Subclasses keep the rider's data, see :class:`Member` and :class:`Entrant`."""
+    __slots__ = ('scraper', 'container', '_profile')
 
     @property
     def id(self):
@@ -276,9 +343,6 @@ class Rider:
             self._profile = self.scraper.profile(self.id)
         return self._profile
 
-    def __getattr__(self, item):
-        return decodeentities(self.data.get(item, None))
-
     def __repr__(self):
         return "<{0.__class__.__name__} id={0.id}, name='{0.name}'>".format(self)
 
@@ -287,10 +351,67 @@ class Member(Rider):
     """
     A member of a team. A member has some base data, but also a full Profile
     """
-    pass
+    __slots__ = ('data',)
+
+    def __init__(self, rider_data, scraper, container):
+        self.data = rider_data
+        self.scraper = scraper
+        self.container = container
+        self._profile = None
+
+    def __getattr__(self, item):
+        return decodeentities(self.data.get(item, None))
 
 
 class Entrant(Rider):
+    """
+    A rider in the signups or results of a race.
+
+    Race files can have thousands of rows, so the fields we use all the time are decoded once into slots. The
+    rows of one file all have the same keys, so instead of a dict per row we keep the values in a tuple, with one
+    ``{key: position}`` index shared by all of them. Any other key is looked up through that index.
+    """
+    FIELDS = ('zwid', 'name', 'tid', 'tname', 'label', 'div', 'flag', 'position_in_cat')
+    __slots__ = FIELDS + ('_index', '_values')
+
+    def __init__(self, rider_data, scraper, container, index=None):
+        self.scraper = scraper
+        self.container = container
+        self._profile = None
+        if index is None:
+            index = self.make_index(rider_data)
+        self._index = index
+        self._values = tuple(rider_data.values())
+        for field in self.FIELDS:
+            setattr(self, field, decodeentities(rider_data.get(field)))
+
+    @staticmethod
+    def make_index(rider_data):
+        return {key: i for i, key in enumerate(rider_data)}
+
+    @classmethod
+    def iter_rows(cls, rows: Iterable[Dict], scraper, container) -> Iterator['Entrant']:
+        indexes = {}
+        for row in rows:
+            keys = tuple(row)
+            if keys not in indexes:
+                indexes[keys] = cls.make_index(row)
+            yield cls(row, scraper=scraper, container=container, index=indexes[keys])
+
+    @classmethod
+    def from_rows(cls, rows, scraper, container) -> List['Entrant']:
+        return list(cls.iter_rows(rows, scraper=scraper, container=container))
+
+    @property
+    def data(self):
+        return dict(zip(self._index, self._values))
+
+    def __getattr__(self, item):
+        if item.startswith('_'):
+            raise AttributeError(item)
+        i = self._index.get(item)
+        return None if i is None else decodeentities(self._values[i])
+
     @property
     def team(self):
         if self.tid:
@@ -309,13 +430,9 @@ class Entrant(Rider):
             return label_mapping[self.label]
         return str(self.label)
 
-    @property
-    def name(self):
-        return self.data['name']
-
     @property
     def teamid(self):
-        return self.data['tid']
+        return self.tid
 
 
 class Race(Fetchable):
@@ -328,6 +445,7 @@ class Race(Fetchable):
         super().__init__(scraper)
         self.id = id_
         self._signups = None
+        self._signups_at = None
         self._results = None
         self._unfiltered = None
         self._html = None
@@ -344,32 +462,50 @@ class Race(Fetchable):
         return self._get("h3").text.strip()
 
 
+    def _entrants(self, url) -> List[Entrant]:
+        return Entrant.from_rows(self.scraper.get_json(url)['data'], scraper=self.scraper, container=self)
+
     @property
     def signups(self) -> Iterator[Entrant]:
-        if not self._signups:
-            url = self.URL_SIGNUPS.format(id=self.id)
+        url = self.URL_SIGNUPS.format(id=self.id)
+        if self._signups is None or self._expired(self._signups_at, url):
             try:
-                self._signups = self.scraper.get_url(url).json()
+                self._signups = self._entrants(url)
             except:
-                self._signups = {'data': []}
-        for entrant in self._signups['data']:
-            yield Entrant(entrant, scraper=self.scraper, container=self)
+                self._signups = []
+            self._signups_at = time.monotonic()
+        yield from self._signups
 
     @property
     def results(self) -> Iterator[Entrant]:
-        if not self._results:
-            url = self.URL_RESULTS.format(id=self.id)
-            self._results = self.scraper.get_url(url).json()
-        for entrant in self._results['data']:
-            yield Entrant(entrant, scraper=self.scraper, container=self)
+        if self._results is None:
+            self._results = self._entrants(self.URL_RESULTS.format(id=self.id))
+        yield from self._results
 
     @property
     def unfiltered(self) -> Iterator[Entrant]:
-        if not self._unfiltered:
-            url = self.URL_UNFILTERED.format(id=self.id)
-            self._unfiltered = self.scraper.get_url(url).json()
-        for entrant in self._unfiltered['data']:
-            yield Entrant(entrant, scraper=self.scraper, container=self)
+        if self._unfiltered is None:
+            self._unfiltered = self._entrants(self.URL_UNFILTERED.format(id=self.id))
+        yield from self._unfiltered
+
+    def _stream(self, loaded: Optional[List[Entrant]], url: str, fields: Iterable[str]) -> Iterator[Entrant]:
+        if loaded is not None:
+            return iter(loaded)
+        rows = self.scraper.iter_json(url.format(id=self.id), fields=fields)
+        return Entrant.iter_rows(rows, scraper=self.scraper, container=self)
+
+    def stream_results(self, fields: Iterable[str] = None) -> Iterator[Entrant]:
+        """
+        Like :attr:`results`, but decodes the file while iterating and doesn't keep the riders around. Meant for
+        exports of big mass-start events.
+
+        :param fields: Only keep these fields of each rider, e.g. ``Entrant.FIELDS``
+        """
+        return self._stream(self._results, self.URL_RESULTS, fields)
+
+    def stream_unfiltered(self, fields: Iterable[str] = None) -> Iterator[Entrant]:
+        """Like :attr:`unfiltered`, but streamed. See :meth:`stream_results`."""
+        return self._stream(self._unfiltered, self.URL_UNFILTERED, fields)
 
     @property
     def categories(self) -> List[str]:
@@ -381,6 +517,7 @@ class Race(Fetchable):
 class Team(Fetchable):
     URL = 'https://zwiftpower.com/team.php?id={id}'
     RIDERS = 'https://zwiftpower.com/api3.php?do=team_riders&id={id}'
+    STORE_KIND = store.TEAM
 
     def __init__(self, id_, scraper):
         super().__init__(scraper)
@@ -403,10 +540,19 @@ class Team(Fetchable):
     def riders_json(self):
         if not self._riders_json:
             url = self.RIDERS.format(id=self.id)
-            resp = self.scraper.get_url(url)
-            self._riders_json = resp.json()
+            self._riders_json = self._stored('riders', lambda: self.scraper.get_json(url))
         return self._riders_json
 
+    def refresh_riders(self):
+        """Fetch the roster from ZwiftPower again, past the memo, the store and the HTTP cache's expiry"""
+        url = self.RIDERS.format(id=self.id)
+        data = self.scraper.get_json(url, refresh=True)
+        rider_store = getattr(self.scraper, 'store', None)
+        if rider_store is not None:
+            rider_store.put(self.STORE_KIND, self.id, 'riders', data)
+        self._riders_json = data
+        return data
+
     @property
     def members(self) -> Iterator[Member]:
         for r in self.riders_json['data']:
@@ -436,11 +582,129 @@ class Team(Fetchable):
         return "<Team id={0.id}, name={0.name}>".format(self)
 
 
+def empty_power_profile():
+    return {
+        type_: {duration: {'pct': None, 'top': None, 'value': None} for duration in (15, 60, 300, 1200)}
+        for type_ in ('wkg', 'watt')
+    }
+
+
+class ProfileSnapshot(NamedTuple):
+    """
+    Everything :class:`Profile` reads from the profile page, extracted in a single pass by :meth:`from_html`.
+    """
+    name: Optional[str] = None
+    cat: Optional[str] = None
+    rank: Optional[int] = None
+    zftp: Optional[int] = None
+    # Weight from the "FTP" row; Profile.weight falls back to the latest race
+    weight: Optional[float] = None
+    country: Optional[str] = None
+    rs: Optional[str] = None
+    team_id: Optional[str] = None
+    punch: Optional[float] = None
+    power_profile: dict = None
+
+    @classmethod
+    def from_html(cls, root, id_=None) -> 'ProfileSnapshot':
+        """
+        :param root: lxml tree of the profile page, e.g. ``Profile.html.lxml``
+        :param id_: Only used for logging
+        """
+        values = {}
+
+        names = root.xpath('//div[@id="zp_submenu"]//a[@href="#tab-results"]')
+        if names:
+            values['name'] = names[0].text_content().strip()
+
+        table = root.get_element_by_id('profile_information', None)
+        cells = {}
+        if table is not None:
+            for i, row in enumerate(table.iter('tr')):
+                if i == 0:
+                    # Rank: <td><small><b>Rank</b> <b>1,234<br>(312.55 pts)</b></small></td>
+                    bold = row.xpath('./td/small/b[2]')
+                    m = re.match(r'\s*([0-9,]+)', (bold[0].text or '') if bold else '')
+                    if m:
+                        values['rank'] = int(m.group(1).replace(',', ''))
+                if 'cat' not in values:
+                    for span in row.iter('span'):
+                        if span.get('title') == 'Mixed 30 day category':
+                            values['cat'] = span.text_content().strip()
+                            break
+                th = row.find('th')
+                td = row.find('td')
+                if th is not None and td is not None:
+                    cells.setdefault(' '.join(th.text_content().split()), td)
+
+        if 'zFTP' in cells:
+            # 220w ~ 86kg
+            values['zftp'] = int(cells['zFTP'].text_content().strip().split('w', 1)[0])
+        else:
+            logger.warning("Could not find zFTP for %s", id_)
+        if 'FTP' in cells:
+            ftp = cells['FTP'].text_content().strip()
+            if '~' in ftp:
+                values['weight'] = float(ftp.split('~', 1)[1].replace('kg', ''))
+        if 'Country' in cells:
+            values['country'] = cells['Country'].text_content().strip()
+        else:
+            logger.warning("Could not find country for %s", id_)
+        if 'Zwift Racing Score' in cells:
+            bold = cells['Zwift Racing Score'].find('b')
+            if bold is not None:
+                values['rs'] = bold.text_content().strip()
+        if 'Team' in cells:
+            link = cells['Team'].find('a')
+            if link is not None:
+                parsed_qs = parse_qs(urlparse(link.get('href', '')).query)
+                if 'id' in parsed_qs:
+                    values['team_id'] = parsed_qs['id'][0]
+
+        overview = root.get_element_by_id('table_scroll_overview', None)
+        if overview is not None:
+            for bar in overview.xpath('.//div[contains(@class, "progress-bar")]/span'):
+                m = re.search(r'Punch:\s*(?P<punch>[0-9\.]*)%', bar.text_content())
+                if m:
+                    values['punch'] = float(m.group('punch'))
+                    break
+
+        values['power_profile'] = cls._power_profile(root)
+        return cls(**values)
+
+    @staticmethod
+    def _power_profile(root):
+        try:
+            sc = next(filter(lambda s: 'function load_profile_spider()' in (s.text or ''), root.iter('script')))
+            decoded = [Profile._decode_spider(x) for x in re.findall(r'{ mean:[^}]* }', sc.text)]
+            return {
+                'wkg': dict(zip([15, 60, 300, 1200], decoded[:4])),
+                'watt': dict(zip([15, 60, 300, 1200], decoded[4:])),
+            }
+        except (StopIteration, demjson.JSONDecodeError):
+            traceback.print_exc()
+            return empty_power_profile()
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProfileSnapshot':
+        """The inverse of ``_asdict()`` after a round trip through JSON, which turns the durations into strings"""
+        data = {k: v for k, v in data.items() if k in cls._fields}
+        power_profile = data.get('power_profile')
+        if power_profile is not None:
+            data['power_profile'] = {type_: {int(duration): value for duration, value in values.items()}
+                                     for type_, values in power_profile.items()}
+        return cls(**data)
+
+
 class Profile(Fetchable):
     URL_PROFILE = 'https://zwiftpower.com/profile.php?z={id}'
     URL_SIGNUPS = 'https://zwiftpower.com/cache3/profile/{id}_signups.json'
     URL_RACES = 'https://zwiftpower.com/cache3/profile/{id}_all.json'
     URL_CP = 'https://zwiftpower.com/api3.php?do=critical_power_profile&zwift_id={id}&zwift_event_id=&type={type}'
+    PREFETCH_PARTS = ('snapshot', 'cp_wkg', 'cp_watts', 'races', 'signups')
+    # The parts kept in the scraper's RiderStore
+    STORED_PARTS = ('snapshot', 'cp_wkg', 'cp_watts', 'races')
+    STORE_KIND = store.PROFILE
 
     def __init__(self, id_: int, scraper):
         super().__init__(scraper)
@@ -448,13 +712,27 @@ class Profile(Fetchable):
         self._html = None
         self._races = None
         self._signups = None
+        self._signups_at = None
         self._cp_wkg = None
         self._cp_watts = None
+        self._snapshot = None
 
     @property
     def url(self):
         return self.URL_PROFILE.format(id=self.id)
 
+    @property
+    def snapshot(self) -> ProfileSnapshot:
+        """The data from the profile page, extracted once"""
+        if self._snapshot is None:
+            # A page without a name didn't parse (or wasn't a profile); don't keep it around
+            data = self._stored('snapshot', lambda: ProfileSnapshot.from_html(self.html.lxml, self.id)._asdict(),
+                                keep=lambda snapshot: snapshot['name'] is not None)
+            self._snapshot = ProfileSnapshot.from_dict(data)
+            # Everything we need from the page is in the snapshot; the parsed page is many times its size
+            self._html = None
+        return self._snapshot
+
     @property
     def html(self):
         if not self._html:
@@ -464,17 +742,15 @@ class Profile(Fetchable):
 
     @property
     def cat(self):
-        return self._get_text('table#profile_information span[title="Mixed 30 day category"]')
+        return self.snapshot.cat
 
     @property
     def name(self):
-        return self._get_text('div#zp_submenu a[href="#tab-results"]')
+        return self.snapshot.name
 
     @property
     def rank(self):
-        s = self._get_text('#profile_information > tr:nth-child(1) > td > small > b:nth-child(2)')
-        if s:
-            return int(s.split("\n")[0].strip().replace(',', ''))
+        return self.snapshot.rank
 
     @property
     def ftp(self):
@@ -482,43 +758,31 @@ class Profile(Fetchable):
 
     @property
     def signups(self):
-        if not self._signups:
-            url = self.URL_SIGNUPS.format(id=self.id)
-            self._signups = self.scraper.get_url(url).json()['data']
+        url = self.URL_SIGNUPS.format(id=self.id)
+        if self._signups is None or self._expired(self._signups_at, url):
+            self._signups_at = time.monotonic()
+            self._signups = self.scraper.get_json(url)['data']
             self._signups = list(filter(lambda e: datetime.fromtimestamp(int(e['tm'])) < datetime.today()+timedelta(days=5), self._signups))
         return self._signups
 
     @property
     def zftp(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'zFTP'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return int(taglist[0].text.strip().split('w', 1)[0])
-        else:
-            logger.warning("Could not find zFTP for %s", self.id)
-            return None
+        return self.snapshot.zftp
 
     @property
     def punch(self):
-        s = self._get_text('#table_scroll_overview > div.btn-toolbar > div.pull-right > div.progress > div.progress-bar > span')
-        m = re.search(r'Punch:\s*(?P<punch>[0-9\.]*)%', s)
-        if m:
-            return float(m.group('punch'))
+        return self.snapshot.punch
 
     @property
-    def races(self):
-        if not self._races:
+    def races(self) -> RaceHistory:
+        if self._races is None:
             url = self.URL_RACES.format(id=self.id)
-            self._races = self.scraper.get_url(url).json()['data']
-            self._races = list(filter(lambda e: e['event_date'] != '', self._races))
+            self._races = RaceHistory(self._stored('races', lambda: self.scraper.get_json(url)['data']))
         return self._races
 
     @property
     def latest_race(self):
-        r = sorted(self.races, key=lambda r: r['event_date'], reverse=True)
-        if len(r) > 0:
-            return r[0]
-        return None
+        return self.races.latest
 
     @property
     def height(self):
@@ -530,10 +794,8 @@ class Profile(Fetchable):
 
     @property
     def weight(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'FTP'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return float(taglist[0].text.strip().split('~', 1)[1].replace('kg', ''))
+        if self.snapshot.weight is not None:
+            return self.snapshot.weight
         # Fall back to using weight from latest race
         race = self.latest_race
         if not race:
@@ -542,26 +804,25 @@ class Profile(Fetchable):
         return weight if weight > 0 else None
 
     @property
-    def cp_watts(self):
-        if not self._cp_watts:
+    def cp_watts(self) -> Optional[CriticalPowerCurve]:
+        """Critical power in watts, e.g. ``cp_watts['90days'][1200]``. ``None`` if the rider has no data."""
+        if self._cp_watts is None:
             try:
                 url_watts = self.URL_CP.format(id=self.id, type='watts')
-                self._cp_watts = self.scraper.get_url(url_watts).json()
+                self._cp_watts = CriticalPowerCurve.from_json(
+                    self._stored('cp_watts', lambda: self.scraper.get_json(url_watts)))
             except:
                 traceback.print_exc()
                 return None
-        if not self._cp_watts or len(self._cp_watts['efforts']) == 0:
-            return None
-        return {effort: {p['x']: p['y'] for p in data} for effort, data in self._cp_watts['efforts'].items()}
+        return self._cp_watts or None
 
     @property
-    def cp_wkg(self):
-        if not self._cp_wkg:
+    def cp_wkg(self) -> Optional[CriticalPowerCurve]:
+        """Critical power in w/kg, like :attr:`cp_watts`"""
+        if self._cp_wkg is None:
             url_wkg = self.URL_CP.format(id=self.id, type='wkg')
-            self._cp_wkg = self.scraper.get_url(url_wkg).json()
-        if not self._cp_wkg or len(self._cp_wkg['efforts']) == 0:
-            return None
-        return {effort: {p['x']: p['y'] for p in data} for effort, data in self._cp_wkg['efforts'].items()}
+            self._cp_wkg = CriticalPowerCurve.from_json(self._stored('cp_wkg', lambda: self.scraper.get_json(url_wkg)))
+        return self._cp_wkg or None
 
     @property
     def power_profile(self):
@@ -573,40 +834,11 @@ class Profile(Fetchable):
         :return: A dict of the form {'wkg':{15:1000,60:700,300:350,1200:270},'watt':{...}}
         :rtype: dict
         """
-        try:
-            sc = next(filter(lambda s: 'function load_profile_spider()' in s.text, self.html.find('script')))
-            decoded = [self._decode_spider(x) for x in re.findall(r'{ mean:[^}]* }', sc.text)]
-            ret = {
-                'wkg': dict(zip([15, 60, 300, 1200], decoded[:4])),
-                'watt': dict(zip([15, 60, 300, 1200], decoded[4:])),
-            }
-            return ret
-        except (StopIteration, demjson.JSONDecodeError):
-            traceback.print_exc()
-            return {
-               'wkg': {
-                   15: {'pct': None, 'top': None, 'value': None},
-                   60: {'pct': None, 'top': None, 'value': None},
-                   300: {'pct': None, 'top': None, 'value': None},
-                   1200: {'pct': None, 'top': None, 'value': None},
-               },
-               'watt': {
-                   15: {'pct': None, 'top': None, 'value': None},
-                   60: {'pct': None, 'top': None, 'value': None},
-                   300: {'pct': None, 'top': None, 'value': None},
-                   1200: {'pct': None, 'top': None, 'value': None},
-               }
-            }
+        return self.snapshot.power_profile
 
     @property
     def country(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'Country'][1]/following-sibling::td[1]")
-        if len(taglist) == 1:
-            # 220w ~ 86kg
-            return taglist[0].text.strip()
-        else:
-            logger.warning("Could not find country for %s", self.id)
-            return None
+        return self.snapshot.country
 
     @property
     def flag(self):
@@ -616,20 +848,12 @@ class Profile(Fetchable):
 
     @property
     def rs(self):
-        taglist = self.html.xpath("//th[normalize-space() = 'Zwift Racing Score'][1]/following-sibling::td[1]/b")
-        if len(taglist) == 1:
-            return taglist[0].text.strip()
+        return self.snapshot.rs
 
     @property
     def team(self) -> Team:
-        taglist = self.html.xpath("//th[normalize-space() = 'Team'][1]/following-sibling::td[1]/a")
-
-        if len(taglist) == 1:
-            href = taglist[0].attrs['href']
-            parsed_url = urlparse(href)
-            parsed_qs = parse_qs(parsed_url.query)
-            if 'id' in parsed_qs:
-                return Team(parsed_qs['id'][0], self.scraper)
+        if self.snapshot.team_id is not None:
+            return self.scraper.team(self.snapshot.team_id)
 
     def __str__(self):
         return "{0.name} ({0.cat}) <{0.id}>".format(self)
@@ -653,50 +877,361 @@ class Profile(Fetchable):
 
 
 class Scraper:
-    DEFAULT_SLEEP = 5.0
+    DEFAULT_CONCURRENCY = 4
+    # profile(), team() and race() hand out the same object for an id for this long, so its fetched and parsed
+    # state is reused. Afterwards a fresh object is created, which goes back to the (HTTP-cached) data. Signups
+    # change faster than that, so they are fetched again after their own cache expiry.
+    FRESHNESS = timedelta(minutes=10)
+    # Number of recently used objects kept alive; older ones stay available as long as someone references them.
+    # Kept small, as the bot runs on a Raspberry Pi and each profile holds its CP curves and race history.
+    IDENTITY_MAP_SIZE = 100
+    # get_json() keeps the parsed body of this many responses, as long as they still carry the same validator.
+    # Bodies larger than JSON_MEMO_MAX_BYTES (big race result files) are parsed again each time instead.
+    JSON_MEMO_SIZE = 200
+    JSON_MEMO_MAX_BYTES = 256 * 1024
+    STREAM_CHUNK_SIZE = 64 * 1024
     HOST = 'https://zwiftpower.com'
     ROOT = '/'
+    LOGIN_FORM = re.compile(rb'<form\b[^>]*\bid\s*=\s*["\']?login\b', re.IGNORECASE)
 
-    def __init__(self, username: str, password: str, sleep: float = None, session: Session = None):
+    def __init__(self, username: str, password: str, session: Session = None, concurrency: int = None,
+                 adapter: BaseAdapter = None, limiter: ratelimit.RateLimiter = None, cookie_file: Path = None,
+                 stale_while_revalidate: Dict[str, timedelta] = None, breaker: circuit.CircuitBreaker = None,
+                 store: 'store.RiderStore' = None):
+        """
+        :param session: Session to use, e.g. a requests_cache CachedSession
+        :param concurrency: Maximum number of requests in flight at the same time
+        :param adapter: Transport adapter to mount on the session. Defaults to a pooled HTTPAdapter sized to
+                        the concurrency
+        :param limiter: Politeness limits for requests that aren't served from the cache. Defaults to the limiter
+                        shared by every Scraper in the process
+        :param cookie_file: Where to keep the login cookies between runs. The file is only readable by the
+                            current user. The restored session is only checked when a response shows we're
+                            logged out, at which point we log in again as usual.
+        :param stale_while_revalidate: ``{url pattern: timedelta}`` like requests_cache's ``urls_expire_after``.
+                                       Expired cached responses for matching URLs are returned right away for up
+                                       to that long past their expiry, and refreshed in the background (under the
+                                       rate limiter, logging in again if needed). Only used with a CachedSession.
+        :param breaker: Per-host circuit breaker. Defaults to the breaker shared by everything in the process.
+                        While ZwiftPower is unavailable, requests fail right away, or get the cached response
+                        regardless of its age when there is one.
+        :param store: Local database of rider and team data. Profiles and teams read their data from it while it's
+                      fresh instead of fetching and parsing it, see :meth:`sync_profiles`.
+        """
         if not all([username, password]):
             raise Exception("Username or password empty")
-        self.sleep = self.DEFAULT_SLEEP if sleep is None else sleep
+        self.concurrency = self.DEFAULT_CONCURRENCY if concurrency is None else concurrency
+        self.limiter = ratelimit.limiter if limiter is None else limiter
+        self.breaker = circuit.breaker if breaker is None else breaker
+        self.store = store
         self.session = session if session is not None else Session()
         self.session.headers.update({'User-Agent': requests_html.user_agent()})
+        if adapter is None:
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+        self.metrics = metrics.Metrics(ENDPOINTS)
+        throttled = ratelimit.ThrottledAdapter(adapter, self.limiter, on_wait=self.metrics.record_wait)
+        # Checked before the rate limiter, so failing fast doesn't wait for (or use up) a token
+        guarded = circuit.BreakerAdapter(throttled, self.breaker)
+        self.session.mount('https://', guarded)
+        self.session.mount('http://', guarded)
+        # Runs interactive work before background jobs, see scheduler.priority()
+        self._executor = scheduler.PriorityExecutor(self.concurrency, thread_name_prefix='scraper')
+        self._login_lock = threading.Lock()
+        self._logins = 0
+        self._objects = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+        self._objects_lock = threading.Lock()
+        self._json = OrderedDict()
+        self._json_lock = threading.Lock()
+        self.stale_while_revalidate = stale_while_revalidate or {}
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+        # Concurrent get_url() calls for the same URL share one request
+        self._flights = SingleFlight()
+        self._local = threading.local()
         self._username = username
         self._password = password
+        self.cookie_file = cookie_file
+        if cookie_file is not None:
+            self._load_cookies()
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run a blocking callable (usually something that ends up in :meth:`get_url`) on the worker pool, under the
+        priority class of the caller, see :func:`scheduler.priority`.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def queued(self) -> Dict[str, int]:
+        """Jobs waiting for a worker, per priority class"""
+        return self._executor.queued()
+
+    async def get_url_async(self, url: str) -> Response:
+        return await self.run(self.get_url, url)
+
+    async def prefetch_profiles(self, ids: Iterable, parts=Profile.PREFETCH_PARTS,
+                                progress: Callable = None) -> Dict[object, Exception]:
+        """
+        Load the given parts of many profiles concurrently, within the concurrency and rate limits.
+
+        Afterwards the profiles from :meth:`profile` have the data in memory. One rider failing doesn't stop the
+        others.
+        :param ids: Zwift ids of the riders
+        :param parts: Lazy :class:`Profile` properties to load
+        :param progress: Optional ``progress(done, total)`` callback, called after each rider. May be a coroutine.
+        :return: The riders that failed, as {id: exception}
+        """
+        return await self._prefetch({id_: parts for id_ in ids}, progress)
+
+    async def sync_profiles(self, ids: Iterable, parts=Profile.STORED_PARTS,
+                            progress: Callable = None) -> Dict[object, Exception]:
+        """
+        Bring the :attr:`store` up to date for many riders: like :meth:`prefetch_profiles`, but each rider only
+        fetches the parts that are missing from the store or too old there. Without a store, it's the same as
+        :meth:`prefetch_profiles`.
 
-    def get_url(self, url: str, is_login=False) -> Response:
+        :param progress: Called as ``progress(done, total)``, where total is the number of riders that needed
+                         anything fetched
+        :return: The riders that failed, as {id: exception}
+        """
+        ids = list(dict.fromkeys(ids))
+        if self.store is None:
+            return await self.prefetch_profiles(ids, parts, progress)
+        stale = self.store.stale(store.PROFILE, ids, parts)
+        jobs = {id_: stale[str(id_)] for id_ in ids if str(id_) in stale}
+        logger.info("Syncing %d of %d profiles", len(jobs), len(ids))
+        return await self._prefetch(jobs, progress)
+
+    async def _prefetch(self, jobs: Dict[object, Iterable[str]], progress: Callable = None):
+        errors = {}
+        done = 0
+
+        async def prefetch(id_, parts):
+            nonlocal done
+            try:
+                await self.profile(id_).load(*parts)
+            except Exception as e:
+                logger.warning("Could not fetch profile %s: %r", id_, e)
+                errors[id_] = e
+            done += 1
+            if progress is not None:
+                result = progress(done, len(jobs))
+                if inspect.isawaitable(result):
+                    await result
+
+        await asyncio.gather(*[prefetch(id_, parts) for id_, parts in jobs.items()])
+        return errors
+
+    def get_url(self, url: str, is_login=False, stream=False, refresh=False) -> Response:
+        """
+        Callers asking for a URL that is already being fetched wait for that request and get the same response.
+
+        :param stream: Don't read the body up front, e.g. to decode it in pieces with ``resp.iter_content()``.
+                       Streamed responses can only be read once, so they are never shared, and they aren't added
+                       to the cache.
+        :param refresh: Check with ZwiftPower even if the cached response is still fresh. This is a conditional
+                        request, so an unchanged page only costs a 304.
+        """
+        start = time.monotonic()
+        if not is_login and not refresh:
+            cached = self._get_swr(url)
+            if cached is not None:
+                if cached.is_expired:
+                    self.metrics.record_request(url, metrics.STALE, time.monotonic() - start)
+                    self._local.stale = self.stale_served() + 1
+                else:
+                    logger.debug("CACHE HIT:  %s" % url)
+                    self.metrics.record_request(url, metrics.HIT, time.monotonic() - start)
+                return cached
+        if is_login or stream:
+            resp, fallback = self._fetch(url, is_login=is_login, stream=stream, refresh=refresh)
+        else:
+            # A refresh mustn't get the cached response from a plain request that happens to be in flight
+            key = (url, 'refresh') if refresh else url
+            (resp, fallback), shared = self._flights.do_shared(key, self._fetch, url, refresh=refresh)
+            if shared:
+                self.metrics.record_request(url, metrics.SHARED, time.monotonic() - start)
+        if fallback:
+            self._local.stale = self.stale_served() + 1
+        return resp
+
+    def stale_served(self) -> int:
+        """
+        How many responses :meth:`get_url` returned on this thread that weren't fresh from ZwiftPower (expired ones
+        served while they're refreshed, or old ones during an outage). Lets a caller tell whether what it just
+        fetched is worth keeping, see :meth:`Fetchable._stored`.
+        """
+        return getattr(self._local, 'stale', 0)
+
+    def _fetch(self, url: str, is_login=False, stream=False, refresh=False) -> Tuple[Response, bool]:
+        """:return: The response, and whether it's an old cached one because ZwiftPower is unavailable"""
+        start = time.monotonic()
+        try:
+            resp = self._send(url, is_login=is_login, stream=stream, refresh=refresh)
+        except Exception as e:
+            cached = None if is_login or not circuit.is_outage(e) else self._get_cached(url)
+            if cached is None:
+                self.metrics.record_request(url, metrics.ERROR, time.monotonic() - start)
+                raise
+            logger.warning("Using the cached response for %s: %s", url, e)
+            self.metrics.record_request(url, metrics.STALE, time.monotonic() - start)
+            return cached, True
+        if not getattr(resp, 'from_cache', False):
+            logger.debug("CACHE MISS: %s" % url)
+            outcome = metrics.MISS
+        elif getattr(resp, 'revalidated', False):
+            logger.debug("NOT MODIFIED: %s" % url)
+            outcome = metrics.REVALIDATED
+        else:
+            logger.debug("CACHE HIT:  %s" % url)
+            outcome = metrics.HIT
+        self.metrics.record_request(url, outcome, time.monotonic() - start)
+        return resp, False
+
+    def _send(self, url: str, is_login=False, stream=False, refresh=False) -> Response:
         logger.debug("GET %s", url)
-        resp = self.session.get(url)
+        logins = self._logins
+        resp = self._get(url, stream=stream, refresh=refresh)
         # If we get a 403 or a login-page, do the login-dance
-        if not is_login and (resp.status_code == 403 or not Scraper._is_logged_in(resp)):
-            logger.warning("Logged out - logging in")
+        if not is_login and (resp.status_code == 403 or not Scraper._is_logged_in(resp, stream=stream)):
             if hasattr(resp, 'cache_key'):
                 # If we're using requests-cache, evict the logged-out response
                 self.session.cache.delete(resp.cache_key)
-            self.login()
-            logger.info("Login successful")
-            resp = self.session.get(url)
+            with self._login_lock:
+                # Concurrent requests all notice the logout; only the first one logs in again
+                if self._logins == logins:
+                    logger.warning("Logged out - logging in")
+                    self.login()
+                    logger.info("Login successful")
+            resp = self._get(url, stream=stream)
+            if resp.status_code == 403 or not Scraper._is_logged_in(resp, stream=stream):
+                # Logging in didn't help, so ZwiftPower is refusing us rather than logged us out. Back off instead
+                # of logging in again for every request.
+                self.breaker.trip(url)
             resp.raise_for_status()
         else:
             resp.raise_for_status()
-
-        if not getattr(resp, 'from_cache', False):
-            logger.debug("CACHE MISS: %s" % url)
-            time.sleep(self.sleep)
-        else:
-            logger.debug("CACHE HIT:  %s" % url)
         return resp
 
+    def _get(self, url: str, stream=False, refresh=False) -> Response:
+        if isinstance(self.session, CachedSession):
+            if refresh:
+                return self.session.get(url, stream=stream, refresh=True)
+            if stream:
+                # Caching a response reads its whole body, which is what streaming avoids. A fresh cached one is
+                # already stored whole, so it may as well be used.
+                cached = self._get_cached(url)
+                if cached is not None and not cached.is_expired:
+                    return cached
+                return self.session.get(url, stream=True, headers={'Cache-Control': 'no-store'})
+        return self.session.get(url, stream=stream)
+
+    def _get_swr(self, url: str) -> Optional[Response]:
+        """
+        For URLs under ``stale_while_revalidate``: the cached response if it's fresh, or if it's expired but may
+        still be used while it's refreshed, in which case the refresh is started. Either way the entry is only
+        loaded from the cache once, instead of here and again in ``session.get()``.
+        """
+        if not self.stale_while_revalidate:
+            return None
+        window = get_url_expiration(url, self.stale_while_revalidate)
+        if not window:
+            return None
+        cached = self._get_cached(url)
+        if cached is None:
+            return None
+        if not cached.is_expired:
+            return cached
+        if cached.expires + window < datetime.now(timezone.utc):
+            return None
+        logger.debug("STALE:      %s" % url)
+        self._revalidate(url)
+        return cached
+
+    def _get_cached(self, url: str) -> Optional[Response]:
+        """The cached response for ``url``, expired or not. Only available with a CachedSession."""
+        if not isinstance(self.session, CachedSession):
+            return None
+        request = self.session.prepare_request(Request('GET', url))
+        return self.session.cache.get_response(self.session.cache.create_key(request))
+
+    def _revalidate(self, url: str):
+        """Refresh the cached response for ``url`` in the background, once at a time"""
+        with self._revalidating_lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+
+        def refresh():
+            try:
+                self._flights.do(url, self._fetch, url)
+            except Exception:
+                logger.warning("Background refresh of %s failed", url, exc_info=True)
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.discard(url)
+
+        self._executor.submit_as(scheduler.BACKGROUND, refresh)
+
+    def get_json(self, url: str, refresh=False):
+        """
+        Fetch ``url`` and return its parsed JSON body. See :meth:`get_url` for ``refresh``.
+
+        Parsed bodies are remembered by their ETag or Last-Modified header, so a cache hit or a 304
+        revalidation of an unchanged file doesn't parse it again.
+        """
+        resp = self.get_url(url, refresh=refresh)
+        validator = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+        if validator is None:
+            return fastjson.response_json(resp)
+        with self._json_lock:
+            memo = self._json.get(url)
+            if memo is not None and memo[0] == validator:
+                self._json.move_to_end(url)
+                return memo[1]
+        data = fastjson.response_json(resp)
+        if len(resp.content) <= self.JSON_MEMO_MAX_BYTES:
+            with self._json_lock:
+                self._json[url] = (validator, data)
+                self._json.move_to_end(url)
+                while len(self._json) > self.JSON_MEMO_SIZE:
+                    self._json.popitem(last=False)
+        return data
+
+    def iter_json(self, url: str, key: Optional[str] = 'data', fields: Iterable[str] = None) -> Iterator:
+        """
+        Fetch ``url`` and decode the array at ``key`` one element at a time, without keeping the decoded body.
+
+        See :func:`jsonstream.iter_items` for ``key`` and ``fields``.
+        """
+        resp = self.get_url(url, stream=True)
+        try:
+            yield from jsonstream.iter_items(resp.iter_content(self.STREAM_CHUNK_SIZE), key=key, fields=fields)
+        finally:
+            resp.close()
+
     def profile(self, id_: int) -> Profile:
-        return Profile(id_, scraper=self)
+        return self._identity(Profile, id_)
 
     def team(self, id_: int) -> Team:
-        return Team(id_, scraper=self)
+        return self._identity(Team, id_)
 
     def race(self, id_: int) -> Race:
-        return Race(id_, scraper=self)
+        return self._identity(Race, id_)
+
+    def _identity(self, cls, id_):
+        # Ids come in as both int and str
+        key = (cls, str(id_))
+        with self._objects_lock:
+            obj = self._objects.get(key)
+            if obj is None or time.monotonic() - obj.created > self.FRESHNESS.total_seconds():
+                obj = self._objects[key] = cls(id_, scraper=self)
+            self._recent[key] = obj
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.IDENTITY_MAP_SIZE:
+                self._recent.popitem(last=False)
+        return obj
 
     def login(self):
         logger.debug("Logging in")
@@ -731,16 +1266,157 @@ class Scraper:
             signon_resp.raise_for_status()
             if not self._is_logged_in(signon_resp):
                 raise Exception("Could not log in")
+            self._logins += 1
+            self.metrics.record_login()
+        if self.cookie_file is not None:
+            self._save_cookies()
+
+    def _load_cookies(self):
+        try:
+            with open(self.cookie_file) as f:
+                cookies = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("Could not read cookies from %s", self.cookie_file, exc_info=True)
+            return
+        for c in cookies:
+            self.session.cookies.set_cookie(create_cookie(**c))
+        self.session.cookies.clear_expired_cookies()
+        logger.debug("Restored %d cookies from %s", len(self.session.cookies), self.cookie_file)
+
+    def _save_cookies(self):
+        cookies = [{
+            'name': c.name,
+            'value': c.value,
+            'domain': c.domain,
+            'path': c.path,
+            'expires': c.expires,
+            'secure': c.secure,
+            'rest': c._rest,
+        } for c in self.session.cookies]
+        # Write to a temporary file that only we can read, then move it in place
+        tmp = '{}.tmp'.format(self.cookie_file)
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cookies, f)
+        os.replace(tmp, self.cookie_file)
+        logger.debug("Saved %d cookies to %s", len(cookies), self.cookie_file)
 
     @staticmethod
-    def _is_logged_in(resp: Response):
-        return html(resp).find('form#login', first=True) is None
+    def _is_logged_in(resp: Response, stream=False):
+        """
+        Check that a response isn't the login page, without parsing it.
+
+        JSON payloads (cache3 files, api3.php) are never the login page, so for those looking at the first byte is
+        enough. Anything else is scanned for the ``<form id="login">`` of the logged-out front page.
+
+        :param stream: Only read the first chunk of the body if it's JSON, and put it back in front of ``resp.raw``,
+                       so the rest can still be decoded piece by piece
+        """
+        head = Scraper._peek(resp) if stream else resp.content[:64]
+        if head[:64].lstrip()[:1] in (b'{', b'['):
+            return True
+        return Scraper.LOGIN_FORM.search(resp.content) is None
+
+    @staticmethod
+    def _peek(resp: Response) -> bytes:
+        """The first chunk of a streamed response's body, read ahead without taking it out of the stream"""
+        chunks = resp.raw.stream(Scraper.STREAM_CHUNK_SIZE, decode_content=True)
+        head = next(chunks, b'')
+        resp.raw = PeekedRaw(resp.raw, head, chunks)
+        return head
+
+
+class PeekedRaw:
+    """
+    The ``raw`` of a streamed response whose first chunk was already read, see :meth:`Scraper._peek`.
+
+    ``stream()`` hands out that chunk again before the rest, so ``resp.iter_content()`` sees the whole body. Chunks
+    keep the size they were peeked with. Anything else goes to the original ``raw``.
+    """
+
+    def __init__(self, raw, head: bytes, chunks: Iterator[bytes]):
+        self._raw = raw
+        self._head = head
+        self._chunks = chunks
+
+    def stream(self, amt=None, decode_content=None):
+        if self._head:
+            head, self._head = self._head, b''
+            yield head
+        yield from self._chunks
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def url_pattern(template: str) -> str:
+    """Turn one of the URL templates into a requests_cache glob pattern"""
+    return re.sub(r'{[a-z_]+}', '*', template.split('://', 1)[-1])
+
+
+# How long each kind of ZwiftPower data is worth caching. Anything else uses EXPIRE_AFTER.
+EXPIRE_AFTER = timedelta(hours=12)
+URLS_EXPIRE_AFTER = {url_pattern(template): expire_after for template, expire_after in (
+    # Signups change minute to minute before a race
+    (Race.URL_SIGNUPS, timedelta(minutes=5)),
+    (Profile.URL_SIGNUPS, timedelta(minutes=5)),
+    # Results come in during and shortly after the race
+    (Race.URL_RESULTS, timedelta(minutes=30)),
+    (Race.URL_UNFILTERED, timedelta(minutes=30)),
+    (Race.URL, timedelta(hours=1)),
+    # A rider's race list only changes when they race
+    (Profile.URL_RACES, timedelta(hours=3)),
+    # Critical power curves are updated daily
+    (Profile.URL_CP, timedelta(days=1)),
+    (Profile.URL_PROFILE, timedelta(hours=12)),
+    # Team rosters change weekly at most
+    (Team.RIDERS, timedelta(days=7)),
+    (Team.URL, timedelta(days=7)),
+)}
+
+
+# URL templates the request metrics are grouped by
+ENDPOINTS = [(cls.__name__ + '.' + name, getattr(cls, name)) for cls, names in (
+    (Race, ('URL', 'URL_SIGNUPS', 'URL_RESULTS', 'URL_UNFILTERED')),
+    (Team, ('URL', 'RIDERS')),
+    (Profile, ('URL_PROFILE', 'URL_SIGNUPS', 'URL_RACES', 'URL_CP')),
+) for name in names]
+
+# How long past their expiry profiles and team rosters are still served while being refreshed in the background,
+# so interactive commands don't wait for ZwiftPower
+URLS_STALE_WHILE_REVALIDATE = {url_pattern(template): window for template, window in (
+    (Profile.URL_PROFILE, timedelta(days=7)),
+    (Profile.URL_CP, timedelta(days=7)),
+    (Profile.URL_RACES, timedelta(days=1)),
+    (Team.RIDERS, timedelta(days=7)),
+    (Team.URL, timedelta(days=7)),
+)}
+
+
+def cached_session(cache_name: str) -> CachedSession:
+    return CachedSession(cache_name, expire_after=EXPIRE_AFTER, urls_expire_after=URLS_EXPIRE_AFTER)
+
 
 def get_scraper() -> Scraper:
-    # cache_dir = Path(user_cache_dir('bakpdlbot'))
-    # cache_dir.mkdir(parents=True, exist_ok=True)
-    # expire_after = timedelta(hours=12)
-    # cached = CachedSession(str(cache_dir / 'zp_cache'), expire_after=expire_after)
+    cache_dir = Path(user_cache_dir('bakpdlbot'))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cached = cached_session(str(cache_dir / 'zp_cache'))
     ZWIFTUSER = os.getenv('ZWIFT_USER')
     ZWIFTPASS = os.getenv('ZWIFT_PASS')
-    return Scraper(sleep=1.0, username=ZWIFTUSER, password=ZWIFTPASS) #, session=cached)
+    return Scraper(username=ZWIFTUSER, password=ZWIFTPASS, session=cached, cookie_file=cache_dir / 'zp_cookies.json',
+                   stale_while_revalidate=URLS_STALE_WHILE_REVALIDATE,
+                   store=store.RiderStore(cache_dir / 'riders.sqlite'))
+
+
+def bot_scraper(bot) -> Scraper:
+    """
+    The Scraper shared by all cogs of the bot, with a single login session and cache.
+
+    It is created on first use and kept on the bot itself, so it also survives a ``!reload`` of the extensions.
+    """
+    scraper = getattr(bot, 'scraper', None)
+    if scraper is None:
+        scraper = bot.scraper = get_scraper()
+    return scraper
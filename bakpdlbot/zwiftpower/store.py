@@ -0,0 +1,134 @@
+"""
+Local SQLite store of what we know about riders and teams.
+
+Every value is kept per ``(kind, id, field)`` with the time it was fetched: a rider's profile page snapshot, both
+critical power curves and race list, a team's roster. :class:`Profile` and :class:`Team` read a field from here
+first and only go to ZwiftPower when it's missing or older than :data:`MAX_AGE`, so parsed data survives restarts
+and HTTP cache clears, and a sync of a few hundred riders only fetches what changed since the last one.
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .. import fastjson
+
+PROFILE = 'profile'
+TEAM = 'team'
+
+# How old a stored field may be before it's fetched again
+MAX_AGE = {
+    (PROFILE, 'snapshot'): timedelta(hours=12),
+    (PROFILE, 'cp_wkg'): timedelta(days=1),
+    (PROFILE, 'cp_watts'): timedelta(days=1),
+    # A rider's race list only changes when they race
+    (PROFILE, 'races'): timedelta(hours=3),
+    (TEAM, 'riders'): timedelta(days=1),
+}
+DEFAULT_MAX_AGE = timedelta(hours=12)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS fields (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (kind, id, field)
+)
+"""
+
+
+def field_max_age(kind: str, field: str) -> timedelta:
+    return MAX_AGE.get((kind, field), DEFAULT_MAX_AGE)
+
+
+class RiderStore:
+    """
+    Thread-safe store on one SQLite database. Values are anything JSON can hold.
+
+    :param path: Database file, created if needed. ``':memory:'`` for a throwaway store.
+    """
+
+    def __init__(self, path: Union[str, Path] = ':memory:', clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        if str(path) != ':memory:':
+            # Let the bot and a riderlist export read while the other one writes
+            self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(SCHEMA)
+
+    def get(self, kind: str, id_, field: str, max_age: Optional[timedelta] = None) -> Optional[Any]:
+        """
+        The stored value, or ``None`` if there is none or it was fetched longer than ``max_age`` ago.
+
+        :param max_age: Defaults to :data:`MAX_AGE` for the field; ``timedelta.max`` for any age
+        """
+        if max_age is None:
+            max_age = field_max_age(kind, field)
+        with self._lock:
+            row = self._db.execute('SELECT value, fetched_at FROM fields WHERE kind = ? AND id = ? AND field = ?',
+                                   (kind, str(id_), field)).fetchone()
+        if row is None or not self._fresh(row[1], max_age):
+            return None
+        return fastjson.loads(row[0])
+
+    def put(self, kind: str, id_, field: str, value: Any, fetched_at: float = None):
+        data = json.dumps(value, separators=(',', ':'))
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO fields (kind, id, field, value, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                             (kind, str(id_), field, data, self._clock() if fetched_at is None else fetched_at))
+
+    def fetched_at(self, kind: str, id_, field: str) -> Optional[float]:
+        """When a field was stored, as a Unix timestamp"""
+        with self._lock:
+            row = self._db.execute('SELECT fetched_at FROM fields WHERE kind = ? AND id = ? AND field = ?',
+                                   (kind, str(id_), field)).fetchone()
+        return None if row is None else row[0]
+
+    def stale(self, kind: str, ids: Iterable, fields: Iterable[str]) -> Dict[str, List[str]]:
+        """
+        Which of ``fields`` are missing or too old for each of ``ids``, as ``{id: [field, ...]}``. Ids that are
+        up to date are left out.
+        """
+        ids = [str(id_) for id_ in dict.fromkeys(ids)]
+        fields = list(fields)
+        fetched = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._db.execute('SELECT id, field, fetched_at FROM fields WHERE kind = ? AND id IN ({})'
+                                        .format(','.join('?' * len(chunk))), [kind] + chunk)
+                fetched.update(((id_, field), at) for id_, field, at in rows)
+        stale = {}
+        for id_ in ids:
+            missing = [f for f in fields if not self._fresh(fetched.get((id_, f)), field_max_age(kind, f))]
+            if missing:
+                stale[id_] = missing
+        return stale
+
+    def delete(self, kind: str, id_, field: str = None):
+        with self._lock:
+            if field is None:
+                self._db.execute('DELETE FROM fields WHERE kind = ? AND id = ?', (kind, str(id_)))
+            else:
+                self._db.execute('DELETE FROM fields WHERE kind = ? AND id = ? AND field = ?',
+                                 (kind, str(id_), field))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM fields')
+
+    def _fresh(self, fetched_at: Optional[float], max_age: timedelta) -> bool:
+        if fetched_at is None:
+            return False
+        return max_age == timedelta.max or self._clock() - fetched_at <= max_age.total_seconds()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -1,9 +1,13 @@
 import pprint
-import requests
+
+from .. import circuit, fastjson
 
 SITE = "https://www.zwiftracing.app"
 API = SITE + "/api"
 
+# Fails fast while zwiftracing.app is unavailable
+session = circuit.session()
+
 
 class JsonWrapper:
     def __init__(self, json):
@@ -53,7 +57,7 @@ class Team:
         }
         i = 0
         while True:
-            result = requests.get(url, params).json()
+            result = fastjson.response_json(session.get(url, params=params))
 
             if 'riders' in result:
                 if len(result['riders']) == 0:
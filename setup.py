@@ -22,13 +22,14 @@ requirements = [
         'requests~=2.25.1'
         'pandas~=2.2.3',
         'pendulum~=2.1.2',
-        'requests-cache~=0.7.2',
+        'requests-cache~=1.2',
         'demjson3~=3.0.6',
         'requests-html~=0.6.6',
         'matplotlib~=3.5.1',
         'jinja2~=3.0.3',
         'appdirs~=1.4.4',
         'html5lib~=1.1',
+        'numpy>=1.20',
         ]
 
 test_requirements = [ ]
@@ -57,6 +58,10 @@ setup(
         ],
     },
     install_requires=requirements,
+    extras_require={
+        # Faster decoding of the ZwiftPower and Zwift JSON payloads, see bakpdlbot.fastjson
+        'fast': ['orjson>=3.6'],
+    },
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
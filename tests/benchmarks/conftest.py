@@ -0,0 +1,22 @@
+import pytest
+
+
+def pytest_collection_modifyitems(config, items):
+    """The benchmarks only run with ``--benchmark-only`` (``make bench``), not with the rest of the tests"""
+    if not config.pluginmanager.hasplugin('benchmark'):
+        reason = "pytest-benchmark is not installed, see requirements_dev.txt"
+    elif not config.getoption('benchmark_only'):
+        reason = "benchmarks only run with --benchmark-only, see `make bench`"
+    else:
+        return
+    skip = pytest.mark.skip(reason=reason)
+    for item in items:
+        if 'benchmark' in getattr(item, 'fixturenames', ()):
+            item.add_marker(skip)
+
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    """Leave the timings of the individual rounds out of ``--benchmark-json`` files, only keep the statistics"""
+    for bench in output_json['benchmarks']:
+        bench['stats'].pop('data', None)
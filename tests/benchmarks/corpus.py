@@ -0,0 +1,52 @@
+"""
+Stored ZwiftPower pages and payloads in the sizes the parser benchmarks run on.
+
+The stored files in ``tests/data`` are the ``stored`` size. ``small`` and ``large`` are made from them by trimming
+or repeating the rows of their results tables, so every size has the same structure: a rider with a handful of
+races, a typical one, and a rider with years of races or a big mass-start event.
+"""
+import json
+import re
+
+from ..stubs import read_data
+
+SIZES = ('small', 'stored', 'large')
+# Table rows per size; None keeps the stored file as it is
+PROFILE_ROWS = {'small': 5, 'stored': None, 'large': 1500}
+RACE_ROWS = {'small': 8, 'stored': None, 'large': 2000}
+
+TBODY = re.compile(rb'(<tbody>\s*)(.*?)(\s*</tbody>)', re.S)
+ROW = re.compile(rb'<tr>.*?</tr>', re.S)
+
+
+def resize_tables(page: bytes, rows) -> bytes:
+    """``page`` with the rows of every table body repeated or trimmed to ``rows``"""
+    if rows is None:
+        return page
+
+    def resize(m):
+        sample = ROW.findall(m.group(2))
+        resized = [sample[i % len(sample)] for i in range(rows)]
+        return m.group(1) + b'\n'.join(resized) + m.group(3)
+
+    return TBODY.sub(resize, page)
+
+
+def profile_page(size: str) -> bytes:
+    return resize_tables(read_data('profile.html'), PROFILE_ROWS[size])
+
+
+def race_page(size: str) -> bytes:
+    return resize_tables(read_data('race.html'), RACE_ROWS[size])
+
+
+def resize_json(payload: bytes, rows) -> bytes:
+    """A results file ``payload`` with its riders repeated or trimmed to ``rows``, each with their own zwid"""
+    if rows is None:
+        return payload
+    sample = json.loads(payload)['data']
+    return json.dumps({'data': [dict(sample[i % len(sample)], zwid=i) for i in range(rows)]}).encode()
+
+
+def race_json(size: str) -> bytes:
+    return resize_json(read_data('race_zwift.json'), RACE_ROWS[size])
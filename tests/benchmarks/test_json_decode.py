@@ -0,0 +1,37 @@
+"""
+Decode speed of the JSON backends in ``bakpdlbot.fastjson`` on the payloads we download.
+
+``cp_wkg.json`` is an ``api3.php`` critical power curve, and the race files are ``race_zwift.json`` in the sizes of
+:mod:`.corpus`.
+"""
+import functools
+import json
+
+import pytest
+
+from bakpdlbot import fastjson
+
+from . import corpus
+from ..stubs import read_data
+
+pytest.importorskip('pytest_benchmark')
+
+PAYLOADS = {'cp_curve': lambda: read_data('cp_wkg.json')}
+PAYLOADS.update({'race_' + size: functools.partial(corpus.race_json, size) for size in corpus.SIZES})
+
+
+@pytest.fixture(params=sorted(fastjson.BACKENDS))
+def backend(request):
+    previous = fastjson.backend
+    fastjson.set_backend(request.param)
+    yield request.param
+    fastjson.set_backend(previous)
+
+
+@pytest.mark.parametrize('payload', sorted(PAYLOADS))
+def test_decode(benchmark, backend, payload):
+    data = PAYLOADS[payload]()
+    benchmark.group = payload
+    benchmark.extra_info['bytes'] = len(data)
+    decoded = benchmark(fastjson.loads, data)
+    assert decoded == json.loads(data)
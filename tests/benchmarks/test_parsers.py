@@ -0,0 +1,120 @@
+"""
+The parsing done for every page the scraper downloads, on the pages in :mod:`.corpus` in each size.
+
+Run with ``make bench``, which compares against the saved ``tests/benchmarks/baseline.json``; ``make
+bench-baseline`` saves a new one. The baseline is only meaningful on the machine it was saved on, so save one
+before changing a parser and compare after.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from bakpdlbot.replay import StandIn
+from bakpdlbot.zwiftpower.scraper import Profile, ProfileSnapshot, Race, Scraper, html
+
+from . import corpus
+
+pytest.importorskip('pytest_benchmark')
+
+PROFILE_URL = Profile.URL_PROFILE.format(id=399078)
+RACE_URL = Race.URL.format(id=3012345)
+# The fields the riderlist templates read for every rider
+TEMPLATE_FIELDS = ('name', 'cat', 'rank', 'zftp', 'weight', 'country', 'rs', 'punch', 'power_profile')
+
+sizes = pytest.mark.parametrize('size', corpus.SIZES)
+
+
+def response(url, content):
+    # html() and Scraper._is_logged_in only read these
+    return SimpleNamespace(url=url, content=content)
+
+
+def parsed(url, content):
+    page = html(response(url, content))
+    page.lxml
+    return page
+
+
+def loaded_race(page):
+    race = Race(3012345, scraper=None)
+    race._html = page
+    return race
+
+
+@sizes
+def test_html_profile(benchmark, size):
+    """Building the requests_html document and its lxml tree for a profile page"""
+    content = corpus.profile_page(size)
+    benchmark.extra_info['bytes'] = len(content)
+    benchmark(parsed, PROFILE_URL, content)
+
+
+@sizes
+def test_html_race(benchmark, size):
+    content = corpus.race_page(size)
+    benchmark.extra_info['bytes'] = len(content)
+    benchmark(parsed, RACE_URL, content)
+
+
+@sizes
+def test_profile_snapshot(benchmark, size):
+    """All the xpath lookups behind the Profile properties, on an already parsed page"""
+    root = parsed(PROFILE_URL, corpus.profile_page(size)).lxml
+    snapshot = benchmark(ProfileSnapshot.from_html, root)
+    assert snapshot.zftp == 280
+
+
+@sizes
+def test_profile_template_fields(benchmark, size):
+    """Reading every template field three times from a fresh Profile: parse once, extract once, then lookups"""
+    content = corpus.profile_page(size)
+
+    def read_fields():
+        profile = Profile(399078, scraper=None)
+        profile._html = html(response(PROFILE_URL, content))
+        for _ in range(3):
+            for field in TEMPLATE_FIELDS:
+                getattr(profile, field)
+        return profile
+
+    profile = benchmark(read_fields)
+    assert profile.name == 'Mick Boekhoff [BAKPDL]'
+
+
+@sizes
+def test_power_profile(benchmark, size):
+    """Finding the spider chart script and decoding its eight points with demjson"""
+    root = parsed(PROFILE_URL, corpus.profile_page(size)).lxml
+    power = benchmark(ProfileSnapshot._power_profile, root)
+    assert power['watt'][1200]['value'] == '320'
+
+
+def test_decode_spider_point(benchmark):
+    point = "{ mean: 5, ours: '921 w', y: 83, color: '#f26f33' }"
+    assert benchmark(Profile._decode_spider, point) == {'top': 1, 'value': '921', 'pct': 83}
+
+
+@sizes
+def test_race_name(benchmark, size):
+    """A CSS lookup through ``Fetchable._get``"""
+    race = loaded_race(parsed(RACE_URL, corpus.race_page(size)))
+    assert benchmark(lambda: race.name) == 'Backpedal Wednesday Race | Stage 3 - Tempus Fugit'
+
+
+@sizes
+def test_race_categories(benchmark, size):
+    race = loaded_race(parsed(RACE_URL, corpus.race_page(size)))
+    assert benchmark(lambda: race.categories) == ['A', 'B', 'C', 'D']
+
+
+@sizes
+@pytest.mark.parametrize('page', ['profile', 'race_json'])
+def test_is_logged_in(benchmark, page, size):
+    """Logged in pages are the slow case: HTML is scanned to the end for the login form"""
+    content = corpus.profile_page(size) if page == 'profile' else corpus.race_json(size)
+    benchmark.extra_info['bytes'] = len(content)
+    assert benchmark(Scraper._is_logged_in, response(PROFILE_URL, content))
+
+
+def test_is_logged_in_front_page(benchmark):
+    assert not benchmark(Scraper._is_logged_in, response(Scraper.HOST, StandIn.FRONT_PAGE.encode()))
@@ -0,0 +1,64 @@
+"""
+Memory use and throughput of race entrants on a large results file.
+
+The ``large`` race file of :mod:`.corpus`, the size of a big mass-start race. ``Member`` is the dict-backed rider
+that keeps the decoded JSON row, which is what every entrant used to be.
+"""
+import json
+import tracemalloc
+
+import pytest
+
+from bakpdlbot.zwiftpower.scraper import Entrant, Member
+
+from . import corpus
+
+pytest.importorskip('pytest_benchmark')
+
+ROWS = corpus.RACE_ROWS['large']
+# What race_power.csv and hilltop-race.html read for every rider
+TEMPLATE_FIELDS = ('zwid', 'name', 'tname', 'label', 'div', 'position_in_cat')
+
+
+@pytest.fixture(scope='module')
+def payload():
+    return corpus.race_json('large')
+
+
+def load(cls, payload):
+    rows = json.loads(payload)['data']
+    if cls is Entrant:
+        return Entrant.from_rows(rows, scraper=None, container=None)
+    return [cls(row, scraper=None, container=None) for row in rows]
+
+
+def retained(cls, payload):
+    """Bytes still allocated once the riders are loaded and the decoded JSON document is gone"""
+    tracemalloc.start()
+    riders = load(cls, payload)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del riders
+    return size
+
+
+def read(riders):
+    for rider in riders:
+        for field in TEMPLATE_FIELDS:
+            getattr(rider, field)
+    return riders
+
+
+@pytest.mark.parametrize('cls', [Entrant, Member], ids=['entrant', 'dict-backed'])
+def test_load_and_read(benchmark, payload, cls):
+    benchmark.extra_info['rows'] = ROWS
+    benchmark.extra_info['retained_bytes_per_rider'] = retained(cls, payload) / ROWS
+    riders = benchmark(lambda: read(load(cls, payload)))
+    assert riders[1].name == 'Jan de Vries & Zn'
+
+
+@pytest.mark.parametrize('cls', [Entrant, Member], ids=['entrant', 'dict-backed'])
+def test_read_loaded(benchmark, payload, cls):
+    """Only the attribute access, as in a template looping over a race several times"""
+    riders = load(cls, payload)
+    benchmark(read, riders)
@@ -0,0 +1,94 @@
+"""Offline stand-ins for the HTTP layer used in the tests."""
+import io
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from urllib3 import HTTPResponse
+
+DATA = Path(__file__).parent / 'data'
+
+GAME_DICTIONARY_URL = 'https://www.zwift.com/zwift-web-pages/gamedictionary'
+GAME_DICTIONARY_SECTIONS = ('ROUTES', 'SEGMENTS', 'JERSEYS', 'RUNSHIRTS', 'RUNSHORTS', 'RUNSHOES', 'BIKESHOES',
+                            'BIKEFRONTWHEELS', 'BIKEREARWHEELS', 'BIKEFRAMES', 'PAINTJOBS', 'SOCKS', 'GLASSES',
+                            'HEADGEARS', 'ACHIEVEMENTS', 'CHALLENGES', 'NOTABLE_MOMENT_TYPES',
+                            'UNLOCKABLE_CATEGORIES', 'TRAINING_PLANS', 'PORTAL_SEGMENTS')
+
+
+def read_data(name) -> bytes:
+    """Contents of a stored page or payload from ``tests/data``"""
+    return (DATA / name).read_bytes()
+
+
+def game_dictionary() -> str:
+    """A minimal Zwift game dictionary, which ``bakpdlbot.zwiftcom`` downloads when it's first imported"""
+    sections = {name: [{name[:-1]: []}] for name in GAME_DICTIONARY_SECTIONS}
+    sections['ROUTES'] = [{'ROUTE': [{'$': {'signature': '2843604888', 'name': 'Tempus Fugit', 'map': 'WATOPIA'}}]}]
+    return json.dumps({'GameDictionary': sections})
+
+
+def import_zwiftcom():
+    """
+    Import ``bakpdlbot.zwiftcom`` without network access: the game dictionary it downloads on import comes from
+    :func:`game_dictionary`, and is cached in a temporary directory.
+    """
+    from bakpdlbot import replay
+    stub = StubAdapter({GAME_DICTIONARY_URL: game_dictionary()})
+    with tempfile.TemporaryDirectory() as tmp, replay.intercept(stub), \
+            mock.patch('appdirs.user_cache_dir', return_value=tmp):
+        import bakpdlbot.zwiftcom
+    return bakpdlbot.zwiftcom
+
+
+class StubAdapter(BaseAdapter):
+    """
+    Transport adapter answering from a ``{url: body}`` dict instead of the network.
+
+    Every request is recorded in :attr:`requests`. ``delay`` simulates a slow server, and
+    :attr:`max_in_flight` tracks how many requests were being answered at the same time. Routes with an ``ETag``
+    header answer a matching ``If-None-Match`` with ``304 Not Modified``.
+    """
+
+    def __init__(self, routes=None, delay=0.0):
+        super().__init__()
+        self.routes = routes or {}
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests.append(request)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            return self.build_response(request, self.routes.get(request.url))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    @staticmethod
+    def build_response(request, route):
+        if route is None:
+            status, body, headers = 404, b'Not found', {}
+        elif isinstance(route, tuple):
+            status, body, headers = route
+        else:
+            status, body, headers = 200, route, {}
+        etag = headers.get('ETag')
+        if etag is not None and request.headers.get('If-None-Match') == etag:
+            status, body = 304, b''
+        body = body.encode() if isinstance(body, str) else body
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, preload_content=False,
+                           request_url=request.url)
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self):
+        pass
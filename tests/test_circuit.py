@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.circuit`."""
+
+import unittest
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import requests
+
+from bakpdlbot.circuit import BreakerAdapter, CircuitBreaker, CircuitOpen, is_outage, retry_after
+
+from .stubs import StubAdapter
+
+URL = 'https://zwiftpower.com/api3.php?do=team_riders&id=13264'
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.rand = 0.0
+        self.breaker = CircuitBreaker(threshold=3, base_delay=5, max_delay=60, jitter=0.5,
+                                      clock=lambda: self.now, rand=lambda: self.rand)
+
+    def test_opens_after_threshold(self):
+        for _ in range(2):
+            self.breaker.failure(URL)
+            self.breaker.check(URL)
+        self.breaker.failure(URL)
+        with self.assertRaises(CircuitOpen) as cm:
+            self.breaker.check(URL)
+        self.assertEqual((cm.exception.host, cm.exception.retry_in), ('zwiftpower.com', 5))
+        # Other hosts aren't affected
+        self.breaker.check('https://us-or-rly101.zwift.com/api/public/events/1')
+
+    def test_success_resets_count(self):
+        self.breaker.failure(URL)
+        self.breaker.failure(URL)
+        self.breaker.success(URL)
+        self.breaker.failure(URL)
+        self.assertEqual(self.breaker.state(URL), 'closed')
+
+    def test_single_probe(self):
+        self.breaker.trip(URL)
+        self.now += 5
+        self.assertEqual(self.breaker.state(URL), 'half-open')
+        self.breaker.check(URL)
+        with self.assertRaises(CircuitOpen):
+            self.breaker.check(URL)
+        self.breaker.success(URL)
+        self.breaker.check(URL)
+
+    def test_exponential_backoff(self):
+        delays = []
+        for _ in range(6):
+            self.breaker.trip(URL)
+            delays.append(self.breaker.snapshot()['zwiftpower.com']['retry_in'])
+            self.now += delays[-1]
+            self.breaker.check(URL)
+        self.assertEqual(delays, [5, 10, 20, 40, 60, 60])
+        # A failed probe opens the circuit again straight away
+        self.breaker.failure(URL)
+        self.assertEqual(self.breaker.state(URL), 'open')
+
+    def test_backoff_starts_over_after_healthy_period(self):
+        self.breaker.trip(URL)
+        self.now += 5
+        self.breaker.trip(URL)
+        self.now += 10 + 61
+        self.breaker.trip(URL)
+        self.assertEqual(self.breaker.snapshot()['zwiftpower.com']['retry_in'], 5)
+
+    def test_jitter(self):
+        self.rand = 1.0
+        self.breaker.trip(URL)
+        self.assertEqual(self.breaker.snapshot()['zwiftpower.com']['retry_in'], 2.5)
+
+    def test_retry_after_opens_right_away(self):
+        self.breaker.failure(URL, retry_after=30)
+        self.assertEqual(self.breaker.snapshot()['zwiftpower.com'],
+                         {'state': 'open', 'failures': 1, 'retry_in': 30})
+
+
+class TestRetryAfter(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(retry_after(SimpleNamespace(headers={'Retry-After': '120'})), 120)
+
+    def test_date(self):
+        when = format_datetime(datetime.now(timezone.utc) + timedelta(minutes=2), usegmt=True)
+        self.assertAlmostEqual(retry_after(SimpleNamespace(headers={'Retry-After': when})), 120, delta=2)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(retry_after(SimpleNamespace(headers={})))
+        self.assertIsNone(retry_after(SimpleNamespace(headers={'Retry-After': 'soon'})))
+
+
+class TestBreakerAdapter(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker(threshold=2)
+        self.stub = StubAdapter()
+        self.session = requests.Session()
+        self.session.mount('https://', BreakerAdapter(self.stub, self.breaker))
+
+    def test_counts_overload_not_client_errors(self):
+        self.stub.routes[URL] = (404, 'Not found', {})
+        for _ in range(3):
+            self.session.get(URL)
+        self.assertEqual(self.breaker.state(URL), 'closed')
+        self.stub.routes[URL] = (502, 'Bad gateway', {})
+        for _ in range(2):
+            self.session.get(URL)
+        with self.assertRaises(CircuitOpen) as cm:
+            self.session.get(URL)
+        self.assertTrue(is_outage(cm.exception))
+        self.assertEqual(len(self.stub.requests), 5)
+
+    def test_retry_after(self):
+        self.stub.routes[URL] = (429, 'Too many requests', {'Retry-After': '300'})
+        self.session.get(URL)
+        self.assertGreaterEqual(self.breaker.snapshot()['zwiftpower.com']['retry_in'], 299)
+
+    def test_connection_errors(self):
+        def refuse(request, **kwargs):
+            raise requests.ConnectionError("refused", request=request)
+        self.stub.send = refuse
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.session.get(URL)
+        self.assertEqual(self.breaker.state(URL), 'open')
+
+
+class TestIsOutage(unittest.TestCase):
+
+    def test_http_errors(self):
+        self.assertTrue(is_outage(requests.HTTPError(response=SimpleNamespace(status_code=503))))
+        self.assertFalse(is_outage(requests.HTTPError(response=SimpleNamespace(status_code=404))))
+        self.assertFalse(is_outage(KeyError('data')))
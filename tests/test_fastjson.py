@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.fastjson`."""
+
+import unittest
+
+import requests
+
+from bakpdlbot import fastjson
+
+from .stubs import StubAdapter
+
+
+class TestFastJson(unittest.TestCase):
+
+    def tearDown(self):
+        fastjson.set_backend('orjson' if 'orjson' in fastjson.BACKENDS else 'json')
+
+    def response(self, body, content_type='application/json'):
+        request = requests.Request('GET', 'https://zwiftpower.com/cache3/results/1_view.json').prepare()
+        return StubAdapter.build_response(request, (200, body, {'Content-Type': content_type}))
+
+    def test_backends_agree(self):
+        body = '{"data": [{"name": "Jan de Vries \\u0026 Zn", "wkg": [4.2, 0], "tid": ""}]}'
+        results = []
+        for name in fastjson.BACKENDS:
+            fastjson.set_backend(name)
+            results.append(fastjson.response_json(self.response(body)))
+        self.assertEqual(results, [results[0]] * len(results))
+
+    def test_falls_back_to_stdlib(self):
+        self.assertEqual(str(fastjson.loads('[NaN]')[0]), 'nan')
+        resp = self.response('{"name": "Zoë"}'.encode('latin-1'), 'application/json; charset=latin-1')
+        self.assertEqual(fastjson.response_json(resp), {'name': 'Zoë'})
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            fastjson.set_backend('simdjson')
+        with self.assertRaises(ValueError):
+            fastjson.loads('{"unterminated": ')
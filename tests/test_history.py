@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.zwiftpower.history`."""
+
+import unittest
+from datetime import date, datetime, timezone
+
+from bakpdlbot.zwiftpower.history import RaceHistory
+
+
+def race(day: date, title='Group Ride', f_t='TYPE_RIDE', **extra):
+    timestamp = int(datetime(day.year, day.month, day.day, 18, tzinfo=timezone.utc).timestamp())
+    return dict(event_date=timestamp, event_title=title, f_t=f_t, **extra)
+
+
+class TestRaceHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.zrl_ttt = race(date(2022, 2, 1), 'Zwift Racing League | TTT', 'TYPE_RACE')
+        self.wtrl = race(date(2021, 5, 4), 'WTRL Team Time Trial - Zone 2', 'TYPE_RACE')
+        self.zrl = race(date(2022, 2, 15), 'Zwift Racing League | Scratch', 'TYPE_RACE', weight=['71.5'])
+        self.ride = race(date(2021, 1, 1))
+        self.history = RaceHistory([self.zrl, self.ride, dict(self.ride, event_date=''), self.zrl_ttt, self.wtrl])
+
+    def test_sorted_without_undated(self):
+        self.assertEqual(list(self.history), [self.ride, self.wtrl, self.zrl_ttt, self.zrl])
+        self.assertEqual(self.history.latest, self.zrl)
+        self.assertIsNone(RaceHistory([]).latest)
+
+    def test_classification(self):
+        self.assertEqual(self.history.races, [self.wtrl, self.zrl_ttt, self.zrl])
+        self.assertEqual(self.history.ttts, [self.wtrl, self.zrl_ttt])
+        self.assertEqual(self.history.zrl, [self.zrl_ttt, self.zrl])
+
+    def test_windows(self):
+        self.assertEqual(self.history.between(date(2021, 5, 4), date(2022, 2, 15)), [self.wtrl, self.zrl_ttt])
+        self.assertEqual(self.history.since(datetime(2022, 2, 2, tzinfo=timezone.utc)), [self.zrl])
+        self.assertEqual(self.history.between(end=self.wtrl['event_date']), [self.ride])
+        self.assertEqual(self.history.since(date(2030, 1, 1)), [])
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.zwiftpower.power`."""
+
+import json
+import unittest
+from types import SimpleNamespace
+
+from bakpdlbot.zwiftpower.power import CriticalPowerCurve, PowerMatrix
+from bakpdlbot.zwiftpower.scraper import Profile
+
+from .stubs import read_data
+from .test_scraper import make_scraper
+
+
+class TestCriticalPowerCurve(unittest.TestCase):
+
+    def setUp(self):
+        self.payload = json.loads(read_data('cp_wkg.json'))
+        self.curve = CriticalPowerCurve.from_json(self.payload)
+
+    def test_dict_compatible(self):
+        expected = {effort: {p['x']: p['y'] for p in data} for effort, data in self.payload['efforts'].items()}
+        self.assertEqual({window: dict(points) for window, points in self.curve.items()}, expected)
+        window = self.curve['90days']
+        self.assertEqual(window[300], expected['90days'][300])
+        self.assertIn(1200, window)
+        self.assertNotIn(1201, window)
+        with self.assertRaises(KeyError):
+            window[1201]
+        self.assertEqual(list(window), sorted(expected['90days']))
+
+    def test_watts_stay_integers(self):
+        curve = CriticalPowerCurve.from_json({'efforts': {'90days': [{'x': 60, 'y': 450}, {'x': 5, 'y': 900}]}})
+        self.assertEqual(curve['90days'][60], 450)
+        self.assertIsInstance(curve['90days'][60], int)
+        self.assertEqual(list(curve['90days'].x), [5, 60])
+
+    def test_interpolation(self):
+        window = self.curve['90days']
+        self.assertEqual(self.curve.at(300), window[300])
+        between = self.curve.at(330)
+        self.assertTrue(window[360] < between < window[300])
+        self.assertIsNone(self.curve.at(0.5))
+        self.assertIsNone(self.curve.at(100000))
+        self.assertIsNone(self.curve.at(300, window='365days'))
+
+    def test_profile_builds_curve_once(self):
+        url = Profile.URL_CP.format(id=1, type='wkg')
+        scraper, adapter = make_scraper({url: read_data('cp_wkg.json')})
+        profile = scraper.profile(1)
+        self.assertIs(profile.cp_wkg, profile.cp_wkg)
+        self.assertEqual(len(adapter.requests), 1)
+
+    def test_profile_without_efforts(self):
+        url = Profile.URL_CP.format(id=1, type='watts')
+        scraper, adapter = make_scraper({url: '{"efforts": {}}'})
+        self.assertIsNone(scraper.profile(1).cp_watts)
+        self.assertIsNone(scraper.profile(1).cp_watts)
+        self.assertEqual(len(adapter.requests), 1)
+
+
+def rider(name, wkg):
+    """A rider with a 90 day w/kg curve of ``{duration: value}`` and watts at 70kg"""
+    def curve(scale):
+        points = [{'x': x, 'y': y * scale} for x, y in wkg.items()]
+        return CriticalPowerCurve.from_json({'efforts': {'90days': points}}) if points else None
+    return SimpleNamespace(name=name, cp_wkg=curve(1), cp_watts=curve(70))
+
+
+class TestPowerMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.riders = [
+            rider('A', {60: 8.0, 300: 5.0, 1200: 4.0}),
+            rider('B', {60: 9.0, 300: 4.5, 1200: 4.2}),
+            rider('C', {60: 7.0, 300: 4.8}),
+            rider('D', {}),
+        ]
+        self.matrix = PowerMatrix(self.riders, [60, 300, 1200, 7200])
+
+    def test_matrix_and_mask(self):
+        self.assertEqual(self.matrix.values['wkg'].shape, (4, 4))
+        self.assertEqual(self.matrix.mask['wkg'].sum(axis=0).tolist(), [3, 3, 2, 0])
+        self.assertEqual(self.matrix.values['watts'][1, 0], 9.0 * 70)
+
+    def test_statistics(self):
+        self.assertEqual(self.matrix.min(), {60: 7.0, 300: 4.5, 1200: 4.0, 7200: None})
+        self.assertEqual(self.matrix.max('watts')[60], 9.0 * 70)
+        self.assertEqual(self.matrix.median()[300], 4.8)
+        self.assertAlmostEqual(self.matrix.percentile(50)[1200], 4.1)
+
+    def test_no_riders(self):
+        empty = PowerMatrix([], [60, 300])
+        nothing = {60: None, 300: None}
+        self.assertEqual((empty.min(), empty.max('watts'), empty.median(), empty.percentile(50), empty.weakest()),
+                         (nothing,) * 5)
+
+    def test_rank_and_weakest(self):
+        self.assertEqual([(r.name, v) for r, v in self.matrix.rank(300)], [('A', 5.0), ('C', 4.8), ('B', 4.5)])
+        self.assertEqual([r.name for r, _ in self.matrix.column(1200)], ['A', 'B'])
+        weakest = self.matrix.weakest()
+        self.assertEqual({d: link and link[0].name for d, link in weakest.items()},
+                         {60: 'C', 300: 'B', 1200: 'A', 7200: None})
+        with self.assertRaises(KeyError):
+            self.matrix.rank(5)
+
+    def test_members_use_their_profile(self):
+        member = SimpleNamespace(name='M', profile=self.riders[0])
+        self.assertEqual(PowerMatrix([member], [300]).min(), {300: 5.0})
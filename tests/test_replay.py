@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""Offline tests for `bakpdlbot.replay`."""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import requests
+
+from bakpdlbot import replay
+from bakpdlbot.circuit import CircuitBreaker
+from bakpdlbot.replay import Cassette, RecordingAdapter, ReplayAdapter, ReplayMiss, StandInAdapter, StandInServer
+from bakpdlbot.zwiftpower.ratelimit import RateLimiter, TokenBucket
+from bakpdlbot.zwiftpower.scraper import Profile, Scraper, Team
+from bakpdlbot.zwiftracing import zwiftracing
+
+from .stubs import GAME_DICTIONARY_URL, StubAdapter, game_dictionary, read_data
+
+
+def make_scraper(adapter):
+    limiter = RateLimiter(TokenBucket(rate=1000, burst=1000), TokenBucket(rate=1000, burst=1000))
+    return Scraper(username='user', password='pass', adapter=adapter, limiter=limiter, breaker=CircuitBreaker())
+
+
+class TestCassette(unittest.TestCase):
+
+    def test_record_and_replay(self):
+        url = Profile.URL_CP.format(id=1, type='wkg')
+        stub = StubAdapter({url: read_data('cp_wkg.json'), 'https://zwiftpower.com/img.png': b'\x89PNG\xff'})
+        cassette = Cassette()
+        with tempfile.TemporaryDirectory() as tmp:
+            scraper = make_scraper(adapter=RecordingAdapter(cassette, inner=stub))
+            recorded = scraper.get_url(url).json()
+            scraper.session.get('https://zwiftpower.com/img.png')
+            cassette.save(Path(tmp) / 'cassette.json')
+
+            replayed = Cassette(Path(tmp) / 'cassette.json')
+        scraper = make_scraper(adapter=ReplayAdapter(replayed))
+        # Parameter order doesn't matter
+        reordered = 'https://zwiftpower.com/api3.php?type=wkg&zwift_id=1&zwift_event_id=&do=critical_power_profile'
+        self.assertEqual(scraper.get_url(reordered).json(), recorded)
+        self.assertEqual(scraper.session.get('https://zwiftpower.com/img.png').content, b'\x89PNG\xff')
+        with self.assertRaises(ReplayMiss):
+            scraper.get_url(Profile.URL_CP.format(id=2, type='wkg'))
+
+    def test_repeated_urls_replay_in_order(self):
+        cassette = Cassette()
+        for body in (b'first', b'second'):
+            cassette.add('GET', 'https://example.com/', 200, {}, body)
+        self.assertEqual([cassette.find('GET', 'https://example.com/')[2] for _ in range(3)],
+                         [b'first', b'second', b'second'])
+
+
+class TestIntercept(unittest.TestCase):
+
+    def test_module_level_requests(self):
+        cassette = Cassette()
+        url = zwiftracing.API + '/riders?club=13264&page=0&pageSize=2&sortBy=points&sortDirection=desc'
+        cassette.add('GET', url, 200, {'Content-Type': 'application/json'},
+                     json.dumps({'riders': [{'riderId': 1, 'name': 'A'}, {'riderId': 2, 'name': 'B'}],
+                                 'totalResults': 2}).encode())
+        with replay.intercept(ReplayAdapter(cassette)):
+            riders = list(zwiftracing.Team(13264).riders(limit=2))
+        self.assertEqual([r.rider_id for r in riders], [1, 2])
+        # Back to normal afterwards
+        self.assertIs(requests.adapters.HTTPAdapter.send, replay._http_send)
+
+    def test_get_event(self):
+        cassette = Cassette()
+        cassette.add('GET', GAME_DICTIONARY_URL, 200, {}, game_dictionary().encode())
+        event = {'id': 3012345, 'name': 'BAKPDL Wednesday Race', 'routeId': 2843604888, 'eventSubgroups': [],
+                 'eventStart': '2022-02-02T19:00:00.000+0000', 'tags': []}
+        cassette.add('GET', 'https://us-or-rly101.zwift.com/api/public/events/3012345', 200, {},
+                     json.dumps(event).encode())
+        with tempfile.TemporaryDirectory() as tmp, replay.intercept(ReplayAdapter(cassette)), \
+                mock.patch('appdirs.user_cache_dir', return_value=tmp):
+            # The game dictionary is downloaded, and cached in the temporary directory, on first import
+            from bakpdlbot.zwiftcom import get_event
+            result = get_event(3012345)
+        self.assertEqual(result.name, 'BAKPDL Wednesday Race')
+        self.assertEqual(result.url, 'https://www.zwift.com/events/view/3012345')
+
+
+class TestStandInServer(unittest.TestCase):
+
+    def test_login_dance_over_http(self):
+        cassette = Cassette()
+        riders = Team.RIDERS.format(id=13264)
+        races = Profile.URL_RACES.format(id=1)
+        cassette.add('GET', riders, 200, {'Content-Type': 'application/json'},
+                     json.dumps({'data': [{'zwid': 1, 'name': 'Jan'}]}).encode())
+        cassette.add('GET', races, 200, {'Content-Type': 'application/json'}, b'{"data": []}')
+        with StandInServer(cassette) as server:
+            scraper = make_scraper(adapter=StandInAdapter(server.url))
+            self.assertEqual(scraper.get_json(races), {'data': []})
+            self.assertEqual(server.standin.logins, 0)
+            # api3.php needs a login, which the scraper does by itself
+            self.assertEqual([m.name for m in scraper.team(13264).members], ['Jan'])
+            self.assertEqual(server.standin.logins, 1)
+            self.assertEqual(scraper.metrics.snapshot()['logins'], 1)
+            self.assertIn(('POST', replay.StandIn.SIGNON), server.standin.requests)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.zwiftpower.roster`."""
+
+import asyncio
+import json
+import unittest
+
+from bakpdlbot.zwiftpower import scheduler
+from bakpdlbot.zwiftpower.roster import Roster, RosterIndex
+from bakpdlbot.zwiftpower.scraper import Profile, Team
+from bakpdlbot.zwiftpower.store import PROFILE, TEAM, RiderStore
+
+from .stubs import read_data
+from .test_scraper import make_scraper
+
+TEAM_ID = 13264
+
+
+def roster(*riders):
+    return json.dumps({'data': [{'zwid': zwid, 'name': name} for zwid, name in riders]})
+
+
+class TestRosterIndex(unittest.TestCase):
+
+    def setUp(self):
+        scraper, _ = make_scraper()
+        self.index = RosterIndex.from_json(json.loads(roster(
+            (1, 'Mick Boekhoff'), (2, 'Mick Jagger'), (3, 'Annemiek'), (4, 'Tom &amp; Jerry'))), scraper)
+
+    def find(self, q):
+        return [m.id for m in self.index.find(q)]
+
+    def test_find(self):
+        self.assertEqual(self.find('mick jagger'), [2])
+        self.assertEqual(self.find('Mick'), [1, 2])
+        self.assertEqual(self.find('miek'), [3])
+        self.assertEqual(self.find('tom & jerry'), [4])
+        self.assertEqual(self.find('nobody'), [])
+
+    def test_diff(self):
+        scraper, _ = make_scraper()
+        newer = RosterIndex.from_json(json.loads(roster(
+            (1, 'Mick Boekhoff [BAKPDL]'), (2, 'Mick Jagger'), (5, 'Marianne'))), scraper)
+        changes = self.index.diff(newer)
+        self.assertEqual([m.id for m in changes.joined], [5])
+        self.assertEqual([m.id for m in changes.left], [3, 4])
+        self.assertEqual([(old, m.name) for old, m in changes.renamed], [('Mick Boekhoff', 'Mick Boekhoff [BAKPDL]')])
+        self.assertEqual(str(changes), "Marianne joined, Annemiek left, Tom & Jerry left, "
+                                       "Mick Boekhoff is now Mick Boekhoff [BAKPDL]")
+        self.assertFalse(newer.diff(newer))
+
+
+class TestRoster(unittest.TestCase):
+
+    def setUp(self):
+        self.store = RiderStore()
+        self.addCleanup(self.store.close)
+        self.routes = {
+            Team.RIDERS.format(id=TEAM_ID): roster((1, 'Annemiek')),
+            Profile.URL_PROFILE.format(id=399078): read_data('profile.html'),
+        }
+        self.scraper, self.adapter = make_scraper(self.routes, store=self.store)
+
+    def test_lookups_dont_fetch(self):
+        team = Roster(self.scraper, TEAM_ID)
+        self.assertEqual(team.find('annemiek'), [])
+        self.assertEqual(self.adapter.requests, [])
+
+    def test_starts_from_stored_roster(self):
+        self.store.put(TEAM, TEAM_ID, 'riders', json.loads(roster((1, 'Annemiek'))), fetched_at=0)
+        team = Roster(self.scraper, TEAM_ID)
+        self.assertEqual(team.find('annemiek'), [self.scraper.profile(1)])
+        self.assertEqual(self.adapter.requests, [])
+
+    def test_refresh(self):
+        team = Roster(self.scraper, TEAM_ID)
+        changes = asyncio.run(team.refresh())
+        self.assertEqual([m.name for m in changes.joined], ['Annemiek'])
+        self.assertEqual(team.find('annemiek'), [self.scraper.profile(1)])
+        self.assertIsNotNone(team.refreshed)
+
+        # The roster memoized by the Team (and fresh in the store) doesn't hold back the next refresh
+        self.routes[Team.RIDERS.format(id=TEAM_ID)] = roster((399078, 'Mick Boekhoff'))
+        self.adapter.requests.clear()
+        sync_profiles = self.scraper.sync_profiles
+        found_while_prewarming = []
+
+        async def prewarm(ids, **kwargs):
+            found_while_prewarming.append(team.find('mick'))
+            return await sync_profiles(ids, **kwargs)
+
+        self.scraper.sync_profiles = prewarm
+        changes = asyncio.run(team.refresh())
+        self.assertEqual(([m.id for m in changes.joined], [m.id for m in changes.left]), ([399078], [1]))
+        self.assertEqual(team.find('annemiek'), [])
+        # New members can be found while their profiles are prewarmed
+        self.assertEqual(found_while_prewarming, [[self.scraper.profile(399078)]])
+        self.assertEqual([r.url for r in self.adapter.requests],
+                         [Team.RIDERS.format(id=TEAM_ID), Profile.URL_PROFILE.format(id=399078)])
+        self.assertIsNotNone(self.store.get(PROFILE, 399078, 'snapshot'))
+        self.assertEqual([m.name for m in self.scraper.team(TEAM_ID).members], ['Mick Boekhoff'])
+
+    def test_failed_refresh_keeps_index(self):
+        team = Roster(self.scraper, TEAM_ID)
+        asyncio.run(team.refresh())
+        del self.routes[Team.RIDERS.format(id=TEAM_ID)]
+        with self.assertRaises(Exception):
+            asyncio.run(team.refresh())
+        self.assertEqual(len(team.index), 1)
+
+    def test_refresh_runs_in_background(self):
+        team = Roster(self.scraper, TEAM_ID)
+        seen = []
+        refresh_riders = team.team.refresh_riders
+        team.team.refresh_riders = lambda: seen.append(scheduler.current()) or refresh_riders()
+        asyncio.run(team.refresh())
+        self.assertEqual(seen, [scheduler.BACKGROUND])
+
+
+if __name__ == '__main__':
+    unittest.main()
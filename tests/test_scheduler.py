@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.zwiftpower.scheduler`."""
+
+import asyncio
+import threading
+import time
+import unittest
+
+from bakpdlbot.zwiftpower import scheduler
+from bakpdlbot.zwiftpower.scheduler import BACKGROUND, INTERACTIVE, NORMAL, PriorityExecutor
+
+
+class TestPriorityExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = PriorityExecutor(1)
+        self.addCleanup(self.executor.shutdown)
+        self.order = []
+        # Keep the only worker busy while the test queues up jobs
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+        started = threading.Event()
+        self.executor.submit_as(BACKGROUND, lambda: started.set() or self.release.wait())
+        started.wait()
+
+    def job(self, name):
+        return lambda: self.order.append(name)
+
+    def run_queued(self, futures):
+        self.release.set()
+        for future in futures:
+            future.result(timeout=5)
+
+    def test_interactive_jumps_the_queue(self):
+        futures = [self.executor.submit_as(BACKGROUND, self.job('b{}'.format(i))) for i in range(3)]
+        futures.append(self.executor.submit_as(INTERACTIVE, self.job('i')))
+        self.run_queued(futures)
+        self.assertEqual(self.order, ['i', 'b0', 'b1', 'b2'])
+
+    def test_fair_share(self):
+        futures = []
+        for cls in (BACKGROUND, NORMAL, INTERACTIVE):
+            futures += [self.executor.submit_as(cls, self.job(cls[0])) for _ in range(20)]
+        self.run_queued(futures)
+        # While all three classes have work queued, they get about 6:3:1 of the workers
+        first = self.order[:20]
+        for name, share in (('i', 12), ('n', 6), ('b', 2)):
+            self.assertAlmostEqual(first.count(name), share, delta=1)
+        self.assertIn('b', first)
+        self.assertEqual(len(self.order), 60)
+
+    def test_submit_uses_callers_class(self):
+        with scheduler.priority(INTERACTIVE):
+            inner = self.executor.submit(scheduler.current)
+        outer = self.executor.submit(scheduler.current)
+        self.run_queued([inner, outer])
+        self.assertEqual((inner.result(), outer.result()), (INTERACTIVE, NORMAL))
+
+    def test_exceptions_and_cancel(self):
+        failing = self.executor.submit(int, 'x')
+        cancelled = self.executor.submit(self.job('cancelled'))
+        self.assertTrue(cancelled.cancel())
+        self.release.set()
+        with self.assertRaises(ValueError):
+            failing.result(timeout=5)
+        self.assertEqual(self.executor.submit(len, 'abc').result(timeout=5), 3)
+        self.assertEqual(self.order, [])
+
+    def test_queued(self):
+        self.executor.submit_as(INTERACTIVE, self.job('i'))
+        self.assertEqual(self.executor.queued(), {INTERACTIVE: 1, NORMAL: 0, BACKGROUND: 0})
+        self.release.set()
+
+
+class TestPriorityContext(unittest.TestCase):
+
+    def test_unknown_class(self):
+        with self.assertRaises(ValueError):
+            with scheduler.priority('urgent'):
+                pass
+
+    def test_prioritized_coroutine(self):
+        executor = PriorityExecutor(2)
+        self.addCleanup(executor.shutdown)
+
+        @scheduler.prioritized(BACKGROUND)
+        async def sweep():
+            # Tasks started here inherit the class
+            loop = asyncio.get_running_loop()
+            return await asyncio.gather(*[loop.run_in_executor(executor, scheduler.current) for _ in range(2)])
+
+        self.assertEqual(asyncio.run(sweep()), [BACKGROUND, BACKGROUND])
+        self.assertEqual(scheduler.current(), NORMAL)
+
+    def test_concurrency(self):
+        executor = PriorityExecutor(3)
+        self.addCleanup(executor.shutdown)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def job():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+        for future in [executor.submit(job) for _ in range(9)]:
+            future.result(timeout=5)
+        self.assertEqual(max(peak), 3)
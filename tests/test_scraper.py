@@ -0,0 +1,600 @@
+#!/usr/bin/env python
+
+"""Offline tests for `bakpdlbot.zwiftpower.scraper`."""
+
+import asyncio
+import json
+import os
+import stat
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+
+from bakpdlbot.circuit import CircuitBreaker, CircuitOpen
+from bakpdlbot.zwiftpower.ratelimit import RateLimiter, TokenBucket
+from bakpdlbot.zwiftpower import jsonstream, scheduler, scraper as scraper_module
+from bakpdlbot.zwiftpower.scraper import Scraper, Profile, ProfileSnapshot, Race, Team
+
+from .stubs import StubAdapter, read_data
+
+
+def make_scraper(routes=None, delay=0.0, **kwargs):
+    adapter = StubAdapter(routes, delay=delay)
+    kwargs.setdefault('limiter', RateLimiter(TokenBucket(rate=1000, burst=1000), TokenBucket(rate=1000, burst=1000)))
+    kwargs.setdefault('breaker', CircuitBreaker())
+    scraper = Scraper(username='user', password='pass', adapter=adapter, **kwargs)
+    return scraper, adapter
+
+
+class TestAsyncScraper(unittest.TestCase):
+
+    def test_load_fetches_concurrently(self):
+        ids = range(1, 9)
+        signups = [{'zid': 1, 'tm': 0}]
+        routes = {Profile.URL_SIGNUPS.format(id=i): json.dumps({'data': signups}) for i in ids}
+        scraper, adapter = make_scraper(routes, delay=0.05, concurrency=4)
+
+        async def load_all():
+            return await asyncio.gather(*[scraper.profile(i).load('signups') for i in ids])
+
+        profiles = asyncio.run(load_all())
+        self.assertEqual([p.signups for p in profiles], [signups] * len(ids))
+        self.assertEqual(len(adapter.requests), len(ids))
+        self.assertEqual(adapter.max_in_flight, 4)
+
+    def test_bot_scraper_is_shared(self):
+        bot = SimpleNamespace()
+        shared, _ = make_scraper()
+        with mock.patch.object(scraper_module, 'get_scraper', return_value=shared) as factory:
+            self.assertIs(scraper_module.bot_scraper(bot), shared)
+            self.assertIs(scraper_module.bot_scraper(bot), shared)
+        factory.assert_called_once()
+
+    def test_get_url_async(self):
+        url = Profile.URL_RACES.format(id=1)
+        scraper, adapter = make_scraper({url: '{"data": []}'})
+        resp = asyncio.run(scraper.get_url_async(url))
+        self.assertEqual(resp.json(), {'data': []})
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, places=2)
+
+    def test_idle_refills_up_to_burst(self):
+        bucket = TokenBucket(rate=100, burst=2)
+        bucket.reserve(), bucket.reserve(), bucket.reserve()
+        time.sleep(0.1)
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0, 0])
+        self.assertGreater(bucket.reserve(), 0)
+
+    def test_take_doesnt_borrow(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        self.assertEqual(bucket.take(), 0)
+        self.assertAlmostEqual(bucket.take(), 0.1, places=2)
+        bucket.reserve()
+        # The reserved token comes first
+        self.assertAlmostEqual(bucket.take(), 0.2, places=2)
+
+    def test_interactive_before_waiting_background(self):
+        bucket = TokenBucket(rate=10, burst=1)
+        urls = [Profile.URL_RACES.format(id=i) for i in range(5)]
+        scraper, adapter = make_scraper(dict.fromkeys(urls, '{"data": []}'), concurrency=5,
+                                        limiter=RateLimiter(static=bucket))
+        bucket.reserve()
+
+        async def sync_then_cp():
+            with scheduler.priority(scheduler.BACKGROUND):
+                background = [asyncio.ensure_future(scraper.get_url_async(url)) for url in urls[1:]]
+            # The background jobs are on the workers, waiting for tokens
+            while scraper.queued()[scheduler.BACKGROUND]:
+                await asyncio.sleep(0.01)
+            with scheduler.priority(scheduler.INTERACTIVE):
+                await scraper.get_url_async(urls[0])
+            await asyncio.gather(*background)
+
+        asyncio.run(sync_then_cp())
+        self.assertEqual(adapter.requests[0].url, urls[0])
+        self.assertEqual(len(adapter.requests), 5)
+
+    def test_buckets_per_endpoint(self):
+        limiter = RateLimiter()
+        self.assertIs(limiter.bucket_for(Profile.URL_RACES.format(id=1)), limiter.buckets[RateLimiter.STATIC])
+        self.assertIs(limiter.bucket_for(Profile.URL_PROFILE.format(id=1)), limiter.buckets[RateLimiter.PAGES])
+        self.assertIsNone(limiter.bucket_for('https://secure.zwift.com/auth/'))
+
+    def test_scrapers_share_the_limiter(self):
+        limiter = RateLimiter(static=TokenBucket(rate=10, burst=1))
+        url = Profile.URL_RACES.format(id=1)
+        first, _ = make_scraper({url: '{"data": []}'}, limiter=limiter)
+        second, _ = make_scraper({url: '{"data": []}'}, limiter=limiter)
+        start = time.monotonic()
+        first.get_url(url)
+        second.get_url(url)
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class TestCookiePersistence(unittest.TestCase):
+
+    def test_cookies_survive_a_restart(self):
+        url = Profile.URL_PROFILE.format(id=1)
+        with tempfile.TemporaryDirectory() as tmp:
+            cookie_file = Path(tmp) / 'cookies.json'
+            first, _ = make_scraper(cookie_file=cookie_file)
+            first.session.cookies.set('phpbb3_lswlk_sid', 'abc', domain='zwiftpower.com', path='/')
+            first._save_cookies()
+            self.assertEqual(stat.S_IMODE(os.stat(cookie_file).st_mode), 0o600)
+
+            second, adapter = make_scraper({url: '<html><body>Profile</body></html>'}, cookie_file=cookie_file)
+            self.assertEqual(second.session.cookies.get('phpbb3_lswlk_sid'), 'abc')
+            second.get_url(url)
+            self.assertEqual([r.url for r in adapter.requests], [url])
+            self.assertIn('phpbb3_lswlk_sid=abc', adapter.requests[0].headers['Cookie'])
+
+    def test_unreadable_cookie_file_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cookie_file = Path(tmp) / 'cookies.json'
+            cookie_file.write_text('not json')
+            scraper, _ = make_scraper(cookie_file=cookie_file)
+            self.assertEqual(len(scraper.session.cookies), 0)
+
+
+class TestLoginDetection(unittest.TestCase):
+
+    def response(self, body, content_type='text/html'):
+        request = requests.Request('GET', Scraper.HOST).prepare()
+        return StubAdapter.build_response(request, (200, body, {'Content-Type': content_type}))
+
+    def test_json_is_logged_in(self):
+        body = json.dumps({'data': [{'name': '<form id="login">'}]})
+        self.assertTrue(Scraper._is_logged_in(self.response(body, 'application/json')))
+        self.assertTrue(Scraper._is_logged_in(self.response('  [1, 2]', 'text/html')))
+
+    def test_login_form(self):
+        body = '<html><body><form method="post" id="login" action="/ucp.php"><a href="#">Login</a></form>'
+        self.assertFalse(Scraper._is_logged_in(self.response(body)))
+        self.assertFalse(Scraper._is_logged_in(self.response(body, 'application/json')))
+
+    def test_other_forms(self):
+        body = '<html><body><form id="login_status"></form><form id="search"></form></body></html>'
+        self.assertTrue(Scraper._is_logged_in(self.response(body)))
+
+
+class TestProfileSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        url = Profile.URL_PROFILE.format(id=399078)
+        self.scraper, self.adapter = make_scraper({url: read_data('profile.html')})
+        self.profile = self.scraper.profile(399078)
+
+    def test_fields(self):
+        p = self.profile
+        self.assertEqual((p.name, p.cat, p.rank, p.zftp), ('Mick Boekhoff [BAKPDL]', 'B', 1234, 280))
+        self.assertEqual((p.weight, p.country, p.flag, p.rs, p.punch), (78.0, 'Netherlands', 'nl', '612', 95.3))
+        self.assertEqual(p.team.id, '13264')
+        self.assertEqual(p.power_profile['wkg'][15], {'top': 1, 'value': '11.8', 'pct': 81})
+        self.assertEqual(p.power_profile['watt'][1200], {'top': None, 'value': '320', 'pct': 72})
+
+    def test_extracted_once(self):
+        snapshot = self.profile.snapshot
+        self.assertIsInstance(snapshot, ProfileSnapshot)
+        self.profile.cat, self.profile.zftp, self.profile.country
+        self.assertIs(self.profile.snapshot, snapshot)
+        self.assertEqual(len(self.adapter.requests), 1)
+        # The parsed page isn't kept once the snapshot has everything
+        self.assertIsNone(self.profile._html)
+
+    def test_missing_fields(self):
+        import lxml.html
+        snapshot = ProfileSnapshot.from_html(lxml.html.fromstring('<html><body><p>Nothing here</p></body></html>'))
+        self.assertIsNone(snapshot.zftp)
+        self.assertIsNone(snapshot.team_id)
+        self.assertEqual(snapshot.power_profile['wkg'][60], {'pct': None, 'top': None, 'value': None})
+
+
+class TestIdentityMap(unittest.TestCase):
+
+    def test_same_object_for_same_id(self):
+        scraper, _ = make_scraper()
+        self.assertIs(scraper.profile(1), scraper.profile('1'))
+        self.assertIs(scraper.team(2), scraper.team(2))
+        self.assertIsNot(scraper.profile(1), scraper.profile(2))
+        self.assertIsNot(scraper.team(1), scraper.race(1))
+
+    def test_fresh_object_after_window(self):
+        scraper, _ = make_scraper()
+        profile = scraper.profile(1)
+        profile.created -= scraper.FRESHNESS.total_seconds() + 1
+        self.assertIsNot(scraper.profile(1), profile)
+
+    def test_bounded(self):
+        scraper, _ = make_scraper()
+        scraper.IDENTITY_MAP_SIZE = 2
+        kept = scraper.profile(1)
+        for i in range(2, 10):
+            scraper.profile(i)
+        self.assertEqual(len(scraper._recent), 2)
+        # Evicted from the recent list, but still alive, so still shared
+        self.assertIs(scraper.profile(1), kept)
+        del kept
+        self.assertLessEqual(len(scraper._objects), 3)
+
+
+class TestRaceEntrants(unittest.TestCase):
+
+    def setUp(self):
+        self.scraper, self.adapter = make_scraper({
+            Race.URL_UNFILTERED.format(id=1): read_data('race_zwift.json'),
+            Race.URL_SIGNUPS.format(id=1): '{"data": []}',
+        })
+        self.race = self.scraper.race(1)
+
+    def test_fields_decoded_once(self):
+        riders = list(self.race.unfiltered)
+        self.assertEqual(len(riders), 12)
+        rider = riders[1]
+        self.assertEqual((rider.id, rider.name, rider.tname), (107919, 'Jan de Vries & Zn', ''))
+        self.assertEqual(riders[2].tname, 'Team "Fast"')
+        self.assertEqual((rider.label, rider.category, rider.div, rider.teamid), ('2', '2', 20, ''))
+        # Keys without a slot come from the original row
+        self.assertEqual(rider.wkg300, rider.data['wkg300'])
+        self.assertIsNone(rider.does_not_exist)
+        self.assertFalse(hasattr(rider, '__dict__') and isinstance(rider.__dict__, dict))
+        # The row is kept once, in _values: no slot is left unused
+        self.assertNotIn('data', [s for cls in type(rider).__mro__ for s in getattr(cls, '__slots__', ())])
+
+    def test_entrants_reused(self):
+        self.assertEqual([id(r) for r in self.race.unfiltered], [id(r) for r in self.race.unfiltered])
+        list(self.race.signups), list(self.race.signups)
+        self.assertEqual(len(self.adapter.requests), 2)
+
+    def test_stream_matches_unfiltered(self):
+        streamed = [(r.id, r.name, r.tname, r.label, r.wkg300) for r in self.race.stream_unfiltered()]
+        self.assertIsNone(self.race._unfiltered)
+        self.assertEqual(streamed, [(r.id, r.name, r.tname, r.label, r.wkg300) for r in self.race.unfiltered])
+
+    def test_stream_not_read_up_front(self):
+        with mock.patch.object(Scraper, 'STREAM_CHUNK_SIZE', 1024):
+            resp = self.scraper.get_url(Race.URL_UNFILTERED.format(id=1), stream=True)
+        # The login check only peeked at the first chunk
+        self.assertFalse(resp._content_consumed)
+        self.assertEqual(resp.raw.tell(), 1024)
+        self.assertEqual(b''.join(resp.iter_content(1024)), read_data('race_zwift.json'))
+
+    def test_stream_not_cached(self):
+        from requests_cache import CachedSession
+        url = Race.URL_UNFILTERED.format(id=1)
+        session = CachedSession('test_stream', backend='memory', expire_after=timedelta(minutes=30))
+        scraper, adapter = make_scraper(dict(self.adapter.routes), session=session)
+        resp = scraper.get_url(url, stream=True)
+        # Caching it would have read the whole body
+        self.assertFalse(resp._content_consumed)
+        self.assertEqual(len(list(scraper.race(1).stream_unfiltered())), 12)
+        self.assertIsNone(scraper._get_cached(url))
+
+        # A response that is cached already is used
+        scraper.get_url(url)
+        self.assertEqual(len(list(scraper.race(1).stream_unfiltered())), 12)
+        self.assertEqual(len(adapter.requests), 3)
+
+    def test_stream_projection(self):
+        rider = next(self.race.stream_unfiltered(fields=('zwid', 'name', 'label')))
+        self.assertEqual(rider.data, {'zwid': rider.id, 'name': rider.name, 'label': rider.label})
+        self.assertIsNone(rider.wkg300)
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def chunks(self, doc: str, size: int):
+        data = doc.encode()
+        return (data[i:i + size] for i in range(0, len(data), size))
+
+    def test_small_chunks(self):
+        doc = read_data('race_zwift.json').decode()
+        expected = json.loads(doc)['data']
+        for size in (1, 7, 4096):
+            self.assertEqual(list(jsonstream.iter_items(self.chunks(doc, size))), expected)
+
+    def test_numbers_split_across_chunks(self):
+        doc = '{"meta": {"n": [1, 2]}, "data": [12345, -6.5e3, "é", 98765]}'
+        self.assertEqual(list(jsonstream.iter_items(self.chunks(doc, 3))), [12345, -6500.0, 'é', 98765])
+
+    def test_top_level_array_and_missing_key(self):
+        self.assertEqual(list(jsonstream.iter_items(self.chunks(' [ ] ', 2), key=None)), [])
+        with self.assertRaises(KeyError):
+            list(jsonstream.iter_items(self.chunks('{"other": []}', 4)))
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_partial_failure_and_progress(self):
+        routes = {Profile.URL_RACES.format(id=i): json.dumps({'data': [{'event_date': i}]}) for i in (1, 2, 4)}
+        scraper, adapter = make_scraper(routes, concurrency=2)
+        calls = []
+
+        async def progress(done, total):
+            calls.append((done, total))
+
+        errors = asyncio.run(scraper.prefetch_profiles([1, 2, 3, 4, 1], parts=('races',), progress=progress))
+        self.assertEqual(list(errors), [3])
+        self.assertEqual(calls, [(i, 4) for i in range(1, 5)])
+        self.assertEqual(scraper.profile(4).races, [{'event_date': 4}])
+        self.assertEqual(len(adapter.requests), 4)
+
+    def test_signups_expire_before_the_object(self):
+        profile_url, race_url = Profile.URL_SIGNUPS.format(id=1), Race.URL_SIGNUPS.format(id=2)
+        routes = {profile_url: json.dumps({'data': []}), race_url: json.dumps({'data': []})}
+        scraper, adapter = make_scraper(routes)
+        profile, race = scraper.profile(1), scraper.race(2)
+        self.assertEqual((profile.signups, list(race.signups)), ([], []))
+        routes[profile_url] = json.dumps({'data': [{'zid': 3, 'tm': 0}]})
+        routes[race_url] = json.dumps({'data': [{'zwid': 4, 'name': 'Annemiek'}]})
+        self.assertEqual((profile.signups, list(race.signups)), ([], []))
+        # Past the 5 minute signups expiry, but the objects are still handed out
+        profile._signups_at -= 301
+        race._signups_at -= 301
+        self.assertIs(scraper.profile(1), profile)
+        self.assertEqual(profile.signups, [{'zid': 3, 'tm': 0}])
+        self.assertEqual([e.name for e in race.signups], ['Annemiek'])
+        self.assertEqual(len(adapter.requests), 4)
+
+
+class TestCachePolicy(unittest.TestCase):
+
+    def test_expiration_per_endpoint(self):
+        from requests_cache.policy.expiration import get_url_expiration
+
+        def expiration(url):
+            return get_url_expiration(url, scraper_module.URLS_EXPIRE_AFTER)
+
+        self.assertEqual(expiration(Race.URL_SIGNUPS.format(id=4012345)), timedelta(minutes=5))
+        self.assertEqual(expiration(Race.URL_RESULTS.format(id=4012345)), timedelta(minutes=30))
+        self.assertEqual(expiration(Profile.URL_SIGNUPS.format(id=399078)), timedelta(minutes=5))
+        self.assertEqual(expiration(Profile.URL_CP.format(id=399078, type='wkg')), timedelta(days=1))
+        self.assertEqual(expiration(Profile.URL_RACES.format(id=399078)), timedelta(hours=3))
+        self.assertEqual(expiration(Team.RIDERS.format(id=13264)), timedelta(days=7))
+        self.assertEqual(expiration(Team.URL.format(id=13264)), timedelta(days=7))
+        self.assertIsNone(expiration(Scraper.HOST + Scraper.ROOT))
+
+
+class TestRevalidation(unittest.TestCase):
+    URL = Profile.URL_RACES.format(id=1)
+    BODY = json.dumps({'data': [{'zid': 4012345, 'event_date': 1600000000}]})
+
+    def make_scraper(self, pages, static):
+        from requests_cache import CachedSession
+        session = CachedSession('test_revalidation', backend='memory', expire_after=timedelta(seconds=0.1))
+        limiter = RateLimiter(pages, static)
+        return make_scraper({self.URL: (200, self.BODY, {'ETag': '"v1"'})}, session=session, limiter=limiter)
+
+    def test_not_modified_reuses_cached_body(self):
+        static = TokenBucket(rate=0.01, burst=2)
+        scraper, adapter = self.make_scraper(TokenBucket(rate=1000, burst=1000), static)
+        first = scraper.get_json(self.URL)
+        time.sleep(0.15)
+        resp = scraper.get_url(self.URL)
+        self.assertEqual(len(adapter.requests), 2)
+        self.assertEqual(adapter.requests[1].headers.get('If-None-Match'), '"v1"')
+        self.assertTrue(resp.from_cache)
+        self.assertTrue(resp.revalidated)
+        # The 304 didn't cost a token, so the second one of the burst is still there
+        self.assertEqual(static.reserve(), 0.0)
+        # The parsed body is reused as long as the validator is unchanged
+        self.assertIs(scraper.get_json(self.URL), first)
+
+    def test_changed_body_is_charged(self):
+        static = TokenBucket(rate=0.01, burst=2)
+        scraper, adapter = self.make_scraper(TokenBucket(rate=1000, burst=1000), static)
+        scraper.get_json(self.URL)
+        time.sleep(0.15)
+        adapter.routes[self.URL] = (200, '{"data": []}', {'ETag': '"v2"'})
+        self.assertEqual(scraper.get_json(self.URL), {'data': []})
+        self.assertGreater(static.reserve(), 0.0)
+
+    def test_refresh_fresh_response(self):
+        scraper, adapter = self.make_scraper(TokenBucket(rate=1000, burst=1000), TokenBucket(rate=1000, burst=1000))
+        scraper.session.settings.expire_after = timedelta(hours=1)
+        first = scraper.get_json(self.URL)
+        self.assertIs(scraper.get_json(self.URL), first)
+        self.assertEqual(len(adapter.requests), 1)
+        # Still fresh, but checked with the server anyway
+        self.assertIs(scraper.get_json(self.URL, refresh=True), first)
+        self.assertEqual(len(adapter.requests), 2)
+        self.assertEqual(adapter.requests[1].headers.get('If-None-Match'), '"v1"')
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    URL = Profile.URL_RACES.format(id=1)
+
+    def setUp(self):
+        from requests_cache import CachedSession
+        session = CachedSession('test_swr', backend='memory', expire_after=timedelta(seconds=0.5))
+        self.scraper, self.adapter = make_scraper({self.URL: '{"data": [1]}'}, session=session,
+                                                  stale_while_revalidate={'*/cache3/*': timedelta(hours=1)})
+        self.scraper.get_url(self.URL)
+        time.sleep(0.55)
+
+    def wait_for_refresh(self):
+        deadline = time.monotonic() + 5
+        while self.scraper._revalidating and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_stale_served_and_refreshed(self):
+        self.adapter.delay = 0.3
+        self.adapter.routes[self.URL] = '{"data": [2]}'
+        start = time.monotonic()
+        resp = self.scraper.get_url(self.URL)
+        self.assertLess(time.monotonic() - start, 0.2)
+        self.assertTrue(resp.is_expired)
+        self.assertEqual(resp.json(), {'data': [1]})
+        # A second reader during the refresh doesn't start another one
+        self.assertEqual(self.scraper.get_url(self.URL).json(), {'data': [1]})
+        self.wait_for_refresh()
+        fresh = self.scraper.get_url(self.URL)
+        self.assertFalse(fresh.is_expired)
+        self.assertEqual(fresh.json(), {'data': [2]})
+        self.assertEqual(len(self.adapter.requests), 2)
+
+    def test_fresh_entry_loaded_once(self):
+        # The background refresh caches the new response for an hour
+        self.scraper.session.settings.expire_after = timedelta(hours=1)
+        self.adapter.routes[self.URL] = '{"data": [2]}'
+        self.scraper.get_url(self.URL)
+        self.wait_for_refresh()
+        cache = self.scraper.session.cache
+        with mock.patch.object(cache, 'get_response', wraps=cache.get_response) as get_response:
+            resp = self.scraper.get_url(self.URL)
+        self.assertEqual(resp.json(), {'data': [2]})
+        self.assertFalse(resp.is_expired)
+        self.assertEqual(get_response.call_count, 1)
+        self.assertEqual(len(self.adapter.requests), 2)
+        self.assertEqual(self.scraper.metrics.snapshot()['endpoints']['Profile.URL_RACES']['hit'], 1)
+
+    def test_other_urls_wait(self):
+        self.scraper.stale_while_revalidate = {'*/profile.php*': timedelta(hours=1)}
+        self.adapter.routes[self.URL] = '{"data": [2]}'
+        self.assertEqual(self.scraper.get_url(self.URL).json(), {'data': [2]})
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_requests_by_endpoint(self):
+        from requests_cache import CachedSession
+        cp = Profile.URL_CP.format(id=1, type='wkg')
+        signups = Race.URL_SIGNUPS.format(id=2)
+        session = CachedSession('test_metrics', backend='memory')
+        scraper, _ = make_scraper({cp: '{"efforts": {}}', signups: '{"data": []}'}, session=session)
+        scraper.get_url(cp)
+        scraper.get_url(cp)
+        scraper.get_url(signups)
+        with self.assertRaises(requests.HTTPError):
+            scraper.get_url(Race.URL_RESULTS.format(id=2))
+
+        stats = scraper.metrics.snapshot()['endpoints']
+        self.assertEqual(set(stats), {'Profile.URL_CP', 'Race.URL_SIGNUPS', 'Race.URL_RESULTS'})
+        self.assertEqual((stats['Profile.URL_CP']['hit'], stats['Profile.URL_CP']['miss']), (1, 1))
+        self.assertEqual(stats['Profile.URL_CP']['hit_ratio'], 0.5)
+        self.assertEqual(stats['Race.URL_RESULTS']['error'], 1)
+        self.assertEqual(stats['Race.URL_SIGNUPS']['latency']['count'], 1)
+        self.assertIn('Profile.URL_CP', scraper.metrics.format())
+
+    def test_waits_and_logins(self):
+        url = Profile.URL_RACES.format(id=1)
+        signon = 'https://secure.zwift.com/signon'
+        routes = {
+            url: '{"data": []}',
+            Scraper.HOST + Scraper.ROOT: '<form id="login"><a href="https://secure.zwift.com/login">Login</a></form>',
+            'https://secure.zwift.com/login': '<form id="form" action="{}"><input name="rememberMe" value="on">'
+                                              '<input name="username"><input name="password"></form>'.format(signon),
+            signon: '<html>Welcome</html>',
+        }
+        limiter = RateLimiter(static=TokenBucket(rate=20, burst=1))
+        scraper, _ = make_scraper(routes, limiter=limiter)
+        scraper.get_url(url)
+        scraper.get_url(url)
+        scraper.login()
+        snapshot = scraper.metrics.snapshot()
+        self.assertEqual(snapshot['logins'], 1)
+        races = snapshot['endpoints']['Profile.URL_RACES']
+        self.assertEqual(races['waits'], 1)
+        self.assertGreater(races['waited'], 0.01)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    URL = Profile.URL_RACES.format(id=1)
+    LOGIN_ROUTES = {
+        Scraper.HOST + Scraper.ROOT: '<form id="login"><a href="https://secure.zwift.com/login">Login</a></form>',
+        'https://secure.zwift.com/login': '<form id="form" action="https://secure.zwift.com/signon">'
+                                          '<input name="rememberMe" value="on"><input name="username">'
+                                          '<input name="password"></form>',
+        'https://secure.zwift.com/signon': '<html>Welcome</html>',
+    }
+
+    def setUp(self):
+        self.now = 1000.0
+        self.breaker = CircuitBreaker(threshold=3, base_delay=10, rand=lambda: 0.0, clock=lambda: self.now)
+
+    def test_outage_fails_fast(self):
+        scraper, adapter = make_scraper({self.URL: (503, 'Service Unavailable', {})}, breaker=self.breaker)
+        for _ in range(3):
+            with self.assertRaises(requests.HTTPError):
+                scraper.get_url(self.URL)
+        with self.assertRaises(CircuitOpen):
+            scraper.get_url(self.URL)
+        self.assertEqual(len(adapter.requests), 3)
+
+        self.now += 10
+        adapter.routes[self.URL] = '{"data": []}'
+        self.assertEqual(scraper.get_json(self.URL), {'data': []})
+        self.assertEqual(self.breaker.state(self.URL), 'closed')
+
+    def test_cached_response_during_outage(self):
+        from requests_cache import CachedSession
+        session = CachedSession('test_circuit', backend='memory', expire_after=timedelta(seconds=0.1))
+        scraper, adapter = make_scraper({self.URL: '{"data": [1]}'}, session=session, breaker=self.breaker)
+        scraper.get_url(self.URL)
+        time.sleep(0.15)
+        adapter.routes[self.URL] = (429, 'Slow down', {'Retry-After': '120'})
+        self.assertEqual(scraper.get_json(self.URL), {'data': [1]})
+        # Retry-After opened the circuit right away; the cache still answers
+        self.assertEqual(scraper.get_json(self.URL), {'data': [1]})
+        self.assertEqual(len(adapter.requests), 2)
+        self.assertEqual(scraper.metrics.snapshot()['endpoints']['Profile.URL_RACES']['stale'], 2)
+
+    def test_refused_after_login_backs_off(self):
+        routes = dict(self.LOGIN_ROUTES, **{self.URL: (403, 'Forbidden', {})})
+        scraper, adapter = make_scraper(routes, breaker=self.breaker)
+        with self.assertRaises(requests.HTTPError):
+            scraper.get_url(self.URL)
+        self.assertEqual(scraper.metrics.snapshot()['logins'], 1)
+        # No more logging in for every request
+        for _ in range(3):
+            with self.assertRaises(CircuitOpen):
+                scraper.get_url(self.URL)
+        self.assertEqual(scraper.metrics.snapshot()['logins'], 1)
+
+        # Still refused after the backoff: the next one is longer
+        self.now += 10
+        with self.assertRaises(requests.HTTPError):
+            scraper.get_url(self.URL)
+        self.now += 10
+        with self.assertRaises(CircuitOpen):
+            scraper.get_url(self.URL)
+        self.assertEqual(scraper.breaker.snapshot()['zwiftpower.com']['retry_in'], 10)
+
+
+class TestSingleFlight(unittest.TestCase):
+    URL = Race.URL_SIGNUPS.format(id=3012345)
+
+    def test_concurrent_requests_share_one(self):
+        scraper, adapter = make_scraper({self.URL: '{"data": [{"zid": 1}]}'}, delay=0.1, concurrency=4)
+
+        async def sweep():
+            return await asyncio.gather(*[scraper.get_url_async(self.URL) for _ in range(4)])
+
+        responses = asyncio.run(sweep())
+        self.assertEqual(len(adapter.requests), 1)
+        self.assertEqual(len({id(resp) for resp in responses}), 1)
+        stats = scraper.metrics.snapshot()['endpoints']['Race.URL_SIGNUPS']
+        self.assertEqual((stats['miss'], stats['shared']), (1, 3))
+        # Once it's done, the next request is a new one
+        scraper.get_url(self.URL)
+        self.assertEqual(len(adapter.requests), 2)
+
+    def test_streams_are_not_shared(self):
+        scraper, adapter = make_scraper({self.URL: '{"data": [{"zid": 1}]}'}, delay=0.1, concurrency=2)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            rows = list(pool.map(lambda _: list(scraper.iter_json(self.URL)), range(2)))
+        self.assertEqual(rows, [[{'zid': 1}]] * 2)
+        self.assertEqual(len(adapter.requests), 2)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.singleflight`."""
+
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from bakpdlbot import replay
+from bakpdlbot.singleflight import SingleFlight
+
+from .stubs import StubAdapter, import_zwiftcom
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one(self):
+        flights = SingleFlight()
+        calls = []
+
+        def fetch(key):
+            calls.append(key)
+            time.sleep(0.1)
+            return object()
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            results = list(pool.map(lambda _: flights.do_shared('a', fetch, 'a'), range(5)))
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(len({id(result) for result, _ in results}), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertFalse(flights.in_flight('a'))
+
+    def test_other_keys_and_later_calls_run(self):
+        flights = SingleFlight()
+        self.assertEqual(flights.do('a', str.upper, 'a'), 'A')
+        self.assertEqual(flights.do('a', str.upper, 'b'), 'B')
+        self.assertEqual(flights.do_shared('c', str.upper, 'c'), ('C', False))
+
+    def test_errors_are_shared(self):
+        flights = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise ValueError("down")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(flights.do, 'a', fail)
+            started.wait()
+            follower = pool.submit(flights.do, 'a', fail)
+            for future in (leader, follower):
+                with self.assertRaises(ValueError):
+                    future.result()
+
+
+class TestGetEvent(unittest.TestCase):
+
+    def test_concurrent_lookups_share_one_request(self):
+        zwiftcom = import_zwiftcom()
+        url = 'https://us-or-rly101.zwift.com/api/public/events/3012345'
+        event = {'id': 3012345, 'name': 'BAKPDL Wednesday Race', 'eventSubgroups': [], 'tags': []}
+        stub = StubAdapter({url: json.dumps(event)}, delay=0.1)
+        with replay.intercept(stub), ThreadPoolExecutor(max_workers=4) as pool:
+            events = list(pool.map(zwiftcom.get_event, [3012345] * 4))
+        self.assertEqual([e.name for e in events], ['BAKPDL Wednesday Race'] * 4)
+        self.assertEqual(len(stub.requests), 1)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""Tests for `bakpdlbot.zwiftpower.store`."""
+
+import asyncio
+import json
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from pathlib import Path
+
+from bakpdlbot.zwiftpower.scraper import Profile, Team
+from bakpdlbot.zwiftpower.store import PROFILE, TEAM, RiderStore
+
+from .stubs import read_data
+from .test_scraper import make_scraper
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRiderStore(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.store = RiderStore(clock=self.clock)
+        self.addCleanup(self.store.close)
+
+    def test_get_put(self):
+        self.assertIsNone(self.store.get(PROFILE, 1, 'races'))
+        self.store.put(PROFILE, 1, 'races', [{'zid': 1}])
+        self.assertEqual(self.store.get(PROFILE, '1', 'races'), [{'zid': 1}])
+        self.assertEqual(self.store.fetched_at(PROFILE, 1, 'races'), 1000.0)
+
+    def test_max_age(self):
+        self.store.put(PROFILE, 1, 'races', [])
+        self.clock.now += timedelta(hours=4).total_seconds()
+        # Races are kept for 3 hours
+        self.assertIsNone(self.store.get(PROFILE, 1, 'races'))
+        self.assertEqual(self.store.get(PROFILE, 1, 'races', max_age=timedelta(hours=5)), [])
+        self.assertEqual(self.store.get(PROFILE, 1, 'races', max_age=timedelta.max), [])
+
+    def test_stale(self):
+        self.store.put(PROFILE, 1, 'snapshot', {})
+        self.store.put(PROFILE, 1, 'races', [])
+        self.store.put(PROFILE, 2, 'snapshot', {})
+        self.clock.now += timedelta(hours=4).total_seconds()
+        self.store.put(PROFILE, 3, 'snapshot', {})
+        self.store.put(PROFILE, 3, 'races', [])
+        self.assertEqual(self.store.stale(PROFILE, [1, 2, 3, 4], ('snapshot', 'races')),
+                         {'1': ['races'], '2': ['races'], '4': ['snapshot', 'races']})
+
+    def test_delete_and_clear(self):
+        self.store.put(TEAM, 1, 'riders', {})
+        self.store.put(PROFILE, 1, 'snapshot', {})
+        self.store.put(PROFILE, 1, 'races', [])
+        self.store.delete(PROFILE, 1, 'races')
+        self.assertIsNone(self.store.get(PROFILE, 1, 'races'))
+        self.assertEqual(self.store.get(PROFILE, 1, 'snapshot'), {})
+        self.store.clear()
+        self.assertIsNone(self.store.get(TEAM, 1, 'riders'))
+
+    def test_persistent(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'riders.sqlite'
+            first = RiderStore(path)
+            first.put(TEAM, 13264, 'riders', {'data': []})
+            first.close()
+            second = RiderStore(path)
+            self.assertEqual(second.get(TEAM, 13264, 'riders'), {'data': []})
+            second.close()
+
+
+class TestScraperStore(unittest.TestCase):
+    ID = 399078
+
+    def setUp(self):
+        self.store = RiderStore()
+        self.addCleanup(self.store.close)
+        self.routes = {
+            Profile.URL_PROFILE.format(id=self.ID): read_data('profile.html'),
+            Profile.URL_RACES.format(id=self.ID): json.dumps({'data': []}),
+            Profile.URL_CP.format(id=self.ID, type='wkg'): read_data('cp_wkg.json'),
+            Team.RIDERS.format(id=13264): json.dumps({'data': [{'zwid': self.ID, 'name': 'Mick'}]}),
+        }
+
+    def scraper(self, **kwargs):
+        return make_scraper(self.routes, store=self.store, **kwargs)
+
+    def test_read_from_store(self):
+        first, adapter = self.scraper()
+        profile = first.profile(self.ID)
+        expected = (profile.snapshot, profile.cp_wkg['90days'][60], list(profile.races),
+                    [m.name for m in first.team(13264).members])
+        self.assertEqual(len(adapter.requests), 4)
+
+        # A new scraper (e.g. after a restart) doesn't go to ZwiftPower while the stored data is fresh
+        second, adapter = self.scraper()
+        profile = second.profile(self.ID)
+        self.assertEqual((profile.snapshot, profile.cp_wkg['90days'][60], list(profile.races),
+                          [m.name for m in second.team(13264).members]), expected)
+        self.assertEqual(profile.power_profile['wkg'][15], {'top': 1, 'value': '11.8', 'pct': 81})
+        self.assertEqual(adapter.requests, [])
+
+    def test_stale_during_outage(self):
+        first, _ = self.scraper()
+        name = first.profile(self.ID).name
+        self.store.put(PROFILE, self.ID, 'snapshot', self.store.get(PROFILE, self.ID, 'snapshot'), fetched_at=0)
+
+        second, adapter = self.scraper()
+        second.breaker.trip(Profile.URL_PROFILE.format(id=self.ID))
+        self.assertEqual(second.profile(self.ID).name, name)
+        self.assertEqual(adapter.requests, [])
+
+    def test_sync_only_fetches_stale(self):
+        first, adapter = self.scraper()
+        errors = asyncio.run(first.sync_profiles([self.ID, 1], parts=('snapshot', 'races')))
+        self.assertEqual(set(errors), {1})
+        self.assertEqual(len(adapter.requests), 4)
+
+        self.store.delete(PROFILE, self.ID, 'races')
+        second, adapter = self.scraper()
+        done = []
+        errors = asyncio.run(second.sync_profiles([self.ID], parts=('snapshot', 'races'),
+                                                  progress=lambda *args: done.append(args)))
+        self.assertEqual(errors, {})
+        self.assertEqual([r.url for r in adapter.requests], [Profile.URL_RACES.format(id=self.ID)])
+        self.assertEqual(done, [(1, 1)])
+
+    def test_expired_response_not_stored(self):
+        from requests_cache import CachedSession
+        url = Profile.URL_RACES.format(id=self.ID)
+        self.routes[url] = json.dumps({'data': [{'event_date': 1}]})
+        session = CachedSession('test_store_swr', backend='memory', expire_after=timedelta(seconds=0.2))
+        scraper, adapter = self.scraper(session=session, stale_while_revalidate={'*/cache3/*': timedelta(hours=1)})
+        scraper.get_url(url)
+        time.sleep(0.25)
+
+        # Served from the expired cached response while it's refreshed in the background
+        self.routes[url] = json.dumps({'data': [{'event_date': 2}]})
+        self.assertEqual(list(scraper.profile(self.ID).races), [{'event_date': 1}])
+        self.assertIsNone(self.store.get(PROFILE, self.ID, 'races'))
+        deadline = time.monotonic() + 5
+        while scraper._revalidating and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        second, _ = self.scraper(session=session)
+        self.assertEqual(list(second.profile(self.ID).races), [{'event_date': 2}])
+        self.assertEqual(self.store.get(PROFILE, self.ID, 'races'), [{'event_date': 2}])
+
+    def test_outage_fallback_not_stored(self):
+        from requests_cache import CachedSession
+        url = Profile.URL_RACES.format(id=self.ID)
+        session = CachedSession('test_store_outage', backend='memory', expire_after=timedelta(seconds=0.1))
+        scraper, _ = self.scraper(session=session)
+        scraper.get_url(url)
+        time.sleep(0.15)
+        scraper.breaker.trip(url)
+        self.assertEqual(list(scraper.profile(self.ID).races), [])
+        self.assertIsNone(self.store.fetched_at(PROFILE, self.ID, 'races'))
+
+
+if __name__ == '__main__':
+    unittest.main()